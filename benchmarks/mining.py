@@ -0,0 +1,105 @@
+"""Mining rate benchmarks.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.mining --difficulties 2 3 4 --transactions 0 10 100 --workers 1 2 4
+"""
+
+import os
+import statistics
+from argparse import ArgumentParser
+from time import perf_counter
+
+from block import Block
+from configuration import Configuration
+from transaction import Transaction
+from utilities.miner import Miner
+from utilities.verification import Verification
+
+SENDER_KEY_LENGTH = 324
+SIGNATURE_LENGTH = 256
+
+
+def random_hex(length):
+    return os.urandom(length // 2).hex()
+
+
+def make_transactions(count):
+    return [
+        Transaction(random_hex(SENDER_KEY_LENGTH), random_hex(SENDER_KEY_LENGTH), 1, random_hex(SIGNATURE_LENGTH))
+        for _ in range(count)
+    ]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    position = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[position]
+
+
+def make_block(difficulty, tx_count, version=None):
+    return Block(1, random_hex(64), make_transactions(tx_count), 0, difficulty=difficulty, version=version)
+
+
+def bench_valid_proof(difficulty, tx_count, attempts, version):
+    block = make_block(difficulty, tx_count, version)
+    started = perf_counter()
+    for proof in range(attempts):
+        Verification.valid_block_proof(block.with_proof(proof))
+    elapsed = perf_counter() - started
+    return {'hashes_per_sec': attempts / elapsed}
+
+
+def bench_proof_of_work(miner, difficulty, tx_count, blocks):
+    block_times = []
+    attempts = 0
+    for _ in range(blocks):
+        block = make_block(difficulty, tx_count)
+        prefix = Verification.block_proof_prefix(block)
+        started = perf_counter()
+        miner.find_proof(prefix, Verification.proof_target(difficulty))
+        block_times.append(perf_counter() - started)
+        attempts += miner.current_nonce + 1
+    return {
+        'hashes_per_sec': attempts / sum(block_times),
+        'mean': statistics.mean(block_times),
+        'p50': percentile(block_times, 0.5),
+        'p95': percentile(block_times, 0.95),
+        'max': max(block_times)
+    }
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--difficulties', type=int, nargs='+', default=[2, 3, 4])
+    parser.add_argument('--transactions', type=int, nargs='+', default=[0, 10, 100])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--blocks', type=int, default=10)
+    parser.add_argument('--attempts', type=int, default=20000)
+    args = parser.parse_args()
+
+    print('valid_proof')
+    print(f'{"version":>7} {"difficulty":>10} {"txs":>6} {"hashes/s":>12}')
+    for version in sorted(set(Configuration.SUPPORTED_BLOCK_VERSIONS)):
+        for difficulty in args.difficulties:
+            for tx_count in args.transactions:
+                result = bench_valid_proof(difficulty, tx_count, args.attempts, version)
+                print(f'{version:>7} {difficulty:>10} {tx_count:>6} {result["hashes_per_sec"]:>12.0f}')
+
+    print('proof_of_work')
+    print(f'{"difficulty":>10} {"txs":>6} {"workers":>7} {"hashes/s":>12} '
+          f'{"mean s":>9} {"p50 s":>9} {"p95 s":>9} {"max s":>9}')
+    for workers in sorted(set(args.workers)):
+        miner = Miner(workers)
+        try:
+            for difficulty in args.difficulties:
+                for tx_count in args.transactions:
+                    result = bench_proof_of_work(miner, difficulty, tx_count, args.blocks)
+                    print(f'{difficulty:>10} {tx_count:>6} {workers:>7} {result["hashes_per_sec"]:>12.0f} '
+                          f'{result["mean"]:>9.4f} {result["p50"]:>9.4f} {result["p95"]:>9.4f} {result["max"]:>9.4f}')
+        finally:
+            miner.close()
+
+
+if __name__ == '__main__':
+    main()
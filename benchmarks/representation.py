@@ -0,0 +1,109 @@
+"""Memory and throughput of Block and Transaction representations.
+
+Compares the slot-based classes with the original dict-backed ones over a
+chain of 100k transactions. Run from the repository root:
+
+    python -m benchmarks.representation --transactions 100000 --per-block 100
+"""
+
+import json
+import os
+import tracemalloc
+from argparse import ArgumentParser
+from collections import OrderedDict
+from time import perf_counter
+
+from block import Block
+from transaction import Transaction
+from utilities.hash_util import HashUtil
+from utilities.verification import Verification
+
+
+class DictTransaction:
+    def __init__(self, sender, recipient, amount, signature):
+        self.sender = sender
+        self.recipient = recipient
+        self.amount = amount
+        self.signature = signature
+
+    def to_ordered_dict(self):
+        return OrderedDict([
+            ('sender', self.sender),
+            ('recipient', self.recipient),
+            ('amount', self.amount),
+            ('signature', self.signature)
+        ])
+
+
+class DictBlock:
+    def __init__(self, index, previous_hash, transactions, proof, block_time=None, difficulty=None):
+        self.index = index
+        self.previous_hash = previous_hash
+        self.timestamp = block_time
+        self.transactions = transactions
+        self.proof = proof
+        self.difficulty = difficulty
+
+    def get_savable_version(self):
+        block_data = self.__dict__.copy()
+        block_data['transactions'] = [tx.to_ordered_dict() for tx in block_data['transactions']]
+        return block_data
+
+
+def dict_hash_block(block):
+    return HashUtil.hash_string_256(json.dumps(block.get_savable_version(), sort_keys=True).encode())
+
+
+def dict_proof_prefix(transactions, last_hash):
+    return (str([tx.to_ordered_dict() for tx in transactions]) + str(last_hash)).encode()
+
+
+def build_chain(block_class, transaction_class, transactions, per_block):
+    keys = [os.urandom(162).hex() for _ in range(64)]
+    chain = []
+    for index in range(0, transactions, per_block):
+        block_transactions = [
+            transaction_class(keys[(index + offset) % 64], keys[(index + offset + 1) % 64], 1,
+                              os.urandom(128).hex())
+            for offset in range(min(per_block, transactions - index))
+        ]
+        chain.append(block_class(len(chain), '', block_transactions, 0, block_time=0, difficulty=2))
+    return chain
+
+
+def measure(label, block_class, transaction_class, hash_block, proof_prefix, args):
+    tracemalloc.start()
+    started = perf_counter()
+    chain = build_chain(block_class, transaction_class, args.transactions, args.per_block)
+    build_time = perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    timings = {}
+    for name, operation in (
+            ('hash_block', hash_block),
+            ('proof_prefix', lambda block: proof_prefix(block.transactions[:-1], '')),
+            ('savable', lambda block: block.get_savable_version())):
+        started = perf_counter()
+        for _ in range(args.passes):
+            for block in chain:
+                operation(block)
+        timings[name] = args.passes * len(chain) / (perf_counter() - started)
+    print(f'{label:>8} {memory / 2 ** 20:>10.1f} {build_time:>8.2f} '
+          f'{timings["hash_block"]:>12.0f} {timings["proof_prefix"]:>12.0f} {timings["savable"]:>12.0f}')
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--per-block', type=int, default=100)
+    parser.add_argument('--passes', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"classes":>8} {"MiB":>10} {"build s":>8} {"hash/s":>12} {"prefix/s":>12} {"savable/s":>12}')
+    measure('dict', DictBlock, DictTransaction, dict_hash_block, dict_proof_prefix, args)
+    measure('slots', Block, Transaction, HashUtil.hash_block, Verification.proof_prefix, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Signing and verification cost per wallet key scheme.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.signing --transactions 200
+"""
+
+import binascii
+from argparse import ArgumentParser
+from time import perf_counter
+
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5
+
+from transaction import Transaction
+from wallet import Wallet, _signed_message, _verify_signature
+
+
+def sign_uncached(wallet, recipient):
+    signer = PKCS1_v1_5.new(RSA.importKey(binascii.unhexlify(wallet.private_key)))
+    return binascii.hexlify(signer.sign(_signed_message(wallet.public_key, recipient, 1, 0))).decode('ascii')
+
+
+def bench(scheme, count):
+    wallet = Wallet(network_id='-benchmark', scheme=scheme)
+    started = perf_counter()
+    wallet.create_keys()
+    keygen = perf_counter() - started
+
+    uncached = None
+    if scheme == Wallet.RSA_SCHEME:
+        started = perf_counter()
+        for position in range(count):
+            sign_uncached(wallet, f'recipient-{position}')
+        uncached = (perf_counter() - started) / count
+
+    started = perf_counter()
+    signatures = [wallet.sign_transaction(wallet.public_key, f'recipient-{position}', 1) for position in range(count)]
+    cached = (perf_counter() - started) / count
+
+    started = perf_counter()
+    for position, signature in enumerate(signatures):
+        assert _verify_signature(wallet.public_key, f'recipient-{position}', 1, signature)
+    verify = (perf_counter() - started) / count
+
+    transaction = Transaction(wallet.public_key, wallet.public_key, 1, signatures[0])
+    return {
+        'keygen': keygen,
+        'sign_uncached': uncached,
+        'sign': cached,
+        'verify': verify,
+        'size': transaction.size
+    }
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--schemes', nargs='+', choices=Wallet.KEY_SCHEMES, default=list(Wallet.KEY_SCHEMES))
+    parser.add_argument('--transactions', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{"scheme":>8} {"keygen ms":>10} {"sign (reparse) us":>18} {"sign us":>9} {"verify us":>10} '
+          f'{"tx bytes":>9}')
+    for scheme in args.schemes:
+        result = bench(scheme, args.transactions)
+        uncached = f'{result["sign_uncached"] * 1e6:.0f}' if result['sign_uncached'] is not None else '-'
+        print(f'{scheme:>8} {result["keygen"] * 1e3:>10.1f} {uncached:>18} {result["sign"] * 1e6:>9.0f} '
+              f'{result["verify"] * 1e6:>10.0f} {result["size"]:>9}')
+
+
+if __name__ == '__main__':
+    main()
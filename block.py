@@ -1,21 +1,164 @@
+import json
 from time import time
 
+from configuration import Configuration
+from transaction import Transaction
+from utilities.encoding import BinaryEncoding, BinaryReader
+from utilities.hash_util import HashUtil
+from utilities.merkle import MerkleTree
+
 
 class Block:
-    def __init__(self, index, previous_hash, transactions, proof, block_time=None):
+    __slots__ = ('version', 'index', 'previous_hash', 'timestamp', 'transactions', 'proof', 'difficulty',
+                 '_savable_version', '_canonical_bytes', '_binary', '_merkle_leaves', '_merkle_root',
+                 '_header_prefix', '_hash')
+    LEGACY_VERSION = 1
+    BINARY_VERSION = 2
+    MERKLE_VERSION = 3
+
+    def __init__(self, index, previous_hash, transactions, proof, block_time=None, difficulty=None, version=None):
+        self.version = Configuration.BLOCK_VERSION if version is None else version
         self.index = index
         self.previous_hash = previous_hash
         self.timestamp = time() if block_time is None else block_time
-        self.transactions = transactions
+        self.transactions = tuple(transactions)
         self.proof = proof
+        self.difficulty = Configuration.MINING_DIFFICULTY if difficulty is None else difficulty
+        self._savable_version = None
+        self._canonical_bytes = None
+        self._binary = None
+        self._merkle_leaves = None
+        self._merkle_root = None
+        self._header_prefix = None
+        self._hash = None
+
+    @classmethod
+    def from_savable_version(cls, block_data):
+        return cls(
+            index=block_data['index'],
+            previous_hash=block_data['previous_hash'],
+            transactions=[Transaction.from_savable_version(tx) for tx in block_data['transactions']],
+            proof=block_data['proof'],
+            block_time=block_data['timestamp'],
+            difficulty=block_data.get('difficulty'),
+            version=block_data.get('version', cls.LEGACY_VERSION)
+        )
+
+    @classmethod
+    def from_bytes(cls, data):
+        reader = BinaryReader(data)
+        version = reader.read_uint8()
+        block = cls(
+            index=reader.read_uint64(),
+            previous_hash=reader.read_text(),
+            block_time=reader.read_number(),
+            proof=reader.read_uint64(),
+            difficulty=reader.read_uint8(),
+            transactions=[Transaction.read_from(reader) for _ in range(reader.read_uint32())],
+            version=version
+        )
+        reader.finish()
+        return block
+
+    def with_proof(self, proof):
+        block = Block(self.index, self.previous_hash, self.transactions, proof, self.timestamp, self.difficulty,
+                      self.version)
+        if self.has_merkle_header:
+            block._merkle_leaves = self.merkle_leaves
+            block._merkle_root = self.merkle_root
+            block._header_prefix = self.header_prefix()
+        return block
 
     def __repr__(self):
-        return f'Index: {self.index}, ' \
+        return f'Version: {self.version}, ' \
+               f'Index: {self.index}, ' \
                f'Previous Hash: {self.previous_hash}, ' \
                f'Proof: {self.proof}, ' \
-               f'Transactions: {self.transactions}'
+               f'Difficulty: {self.difficulty}, ' \
+               f'Transactions: {list(self.transactions)}'
+
+    def get_header(self):
+        header = {
+            'version': self.version,
+            'index': self.index,
+            'previous_hash': self.previous_hash,
+            'timestamp': self.timestamp,
+            'proof': self.proof,
+            'difficulty': self.difficulty,
+            'hash': self.hash
+        }
+        if self.has_merkle_header:
+            header['merkle_root'] = self.merkle_root.hex()
+        return header
+
+    @property
+    def has_merkle_header(self):
+        return self.version >= self.MERKLE_VERSION
+
+    @property
+    def merkle_leaves(self):
+        if self._merkle_leaves is None:
+            self._merkle_leaves = tuple(MerkleTree.leaf_hash(tx.to_bytes()) for tx in self.transactions)
+        return self._merkle_leaves
+
+    @property
+    def merkle_root(self):
+        if self._merkle_root is None:
+            self._merkle_root = MerkleTree.root(self.merkle_leaves)
+        return self._merkle_root
+
+    def merkle_proof(self, position):
+        return MerkleTree.proof(self.merkle_leaves, position)
+
+    def header_prefix(self):
+        if self._header_prefix is None:
+            self._header_prefix = BinaryEncoding.pack_uint8(self.version) \
+                + BinaryEncoding.pack_uint64(self.index) \
+                + BinaryEncoding.pack_text(self.previous_hash) \
+                + self.merkle_root \
+                + BinaryEncoding.pack_number(self.timestamp) \
+                + BinaryEncoding.pack_uint8(self.difficulty)
+        return self._header_prefix
 
     def get_savable_version(self):
-        block_data = self.__dict__.copy()
-        block_data['transactions'] = [tx.to_ordered_dict() for tx in block_data['transactions']]
-        return block_data
+        if self._savable_version is None:
+            self._savable_version = {
+                'index': self.index,
+                'previous_hash': self.previous_hash,
+                'timestamp': self.timestamp,
+                'transactions': [tx.to_ordered_dict() for tx in self.transactions],
+                'proof': self.proof
+            }
+            if self.version != self.LEGACY_VERSION:
+                self._savable_version['difficulty'] = self.difficulty
+                self._savable_version['version'] = self.version
+        return self._savable_version
+
+    def to_bytes(self):
+        if self._binary is None:
+            self._binary = BinaryEncoding.pack_uint8(self.version) \
+                + BinaryEncoding.pack_uint64(self.index) \
+                + BinaryEncoding.pack_text(self.previous_hash) \
+                + BinaryEncoding.pack_number(self.timestamp) \
+                + BinaryEncoding.pack_uint64(self.proof) \
+                + BinaryEncoding.pack_uint8(self.difficulty) \
+                + BinaryEncoding.UINT32.pack(len(self.transactions)) \
+                + b''.join(tx.to_bytes() for tx in self.transactions)
+        return self._binary
+
+    @property
+    def canonical_bytes(self):
+        if self._canonical_bytes is None:
+            if self.version == self.LEGACY_VERSION:
+                self._canonical_bytes = json.dumps(self.get_savable_version(), sort_keys=True).encode()
+            elif self.has_merkle_header:
+                self._canonical_bytes = self.header_prefix() + str(self.proof).encode()
+            else:
+                self._canonical_bytes = self.to_bytes()
+        return self._canonical_bytes
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = HashUtil.hash_string_256(self.canonical_bytes)
+        return self._hash
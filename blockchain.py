@@ -1,92 +1,212 @@
-import json
-from functools import reduce
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 import requests
 
+from utilities.encoding import BinaryEncoding
 from utilities.hash_util import HashUtil
 from utilities.verification import Verification
+from utilities.ledger import Ledger
+from utilities.address_index import AddressIndex
+from utilities.block_template import BlockTemplate
+from utilities.mempool import Mempool
+from utilities.mempool_journal import MempoolJournal
+from utilities.miner import Miner
+from utilities.storage import ChainStorage
+from utilities.utxo import UtxoSet
+from utilities.stored_chain import StoredChain, ChainView
+from utilities.gossip import GossipDispatcher
+from utilities.locks import ReadWriteLock, read_locked, write_locked
+from utilities.metrics import REGISTRY
 from block import Block
 from transaction import Transaction
 from configuration import Configuration
 from wallet import Wallet
 
+_proof_of_work_seconds = REGISTRY.histogram(
+    'blockchain_proof_of_work_seconds', 'Time spent searching for a proof.', ['outcome']
+)
+_proof_attempts = REGISTRY.counter('blockchain_proof_attempts_total', 'Nonces tried while searching for proofs.')
+_storage_seconds = REGISTRY.histogram(
+    'blockchain_storage_seconds', 'Time spent loading and saving node data.', ['operation']
+)
+_blocks_added = REGISTRY.counter('blockchain_blocks_added_total', 'Blocks appended to the chain.', ['source'])
+_chain_replacements = REGISTRY.counter(
+    'blockchain_chain_replacements_total', 'Chain suffixes replaced by a peer chain.'
+)
+
 
 class Blockchain:
-    def __init__(self, hosting_node_id, network_id=None):
+    def __init__(self, hosting_node_id, network_id=None, mining_workers=None):
+        self.lock = ReadWriteLock()
+        self.__mining_cancel_events = set()
         self.hosting_node = hosting_node_id
+        self.miner = Miner(mining_workers if mining_workers is not None else Configuration.MINING_WORKERS)
+        self.block_template = BlockTemplate()
         self.resolve_conflicts = False
+        self.gossip = GossipDispatcher()
         self.network_id = network_id if network_id is not None else ''
-        self.chain = [Block(
+        self.ledger = Ledger()
+        self.__ledger_height = 0
+        self.utxos = UtxoSet() if Configuration.LEDGER_MODE == 'utxo' else None
+        self.__utxo_height = 0
+        self.storage = ChainStorage(Configuration.BLOCKCHAIN_FILE + str(self.network_id))
+        self.address_index = AddressIndex(self.storage)
+        self.mempool_journal = MempoolJournal(self.storage)
+        self.__chain = StoredChain(self.storage, [Block(
             index=0,
             previous_hash='',
             transactions=[],
             proof=0,
-            block_time=0
-        )]
+            block_time=0,
+            version=Block.LEGACY_VERSION
+        )])
         self.open_transactions = []
         self.__peer_nodes = set()
         self.load_data()
+        self.mempool_journal.start()
 
     @property
-    def chain(self):
-        return self.__chain[:]
-
-    @chain.setter
-    def chain(self, value):
-        self.__chain = value
+    def chain_view(self):
+        return ChainView(self.__chain, self.lock)
 
     @property
+    @read_locked
     def open_transactions(self):
-        return self.__open_transactions[:]
+        return list(self.__open_transactions)
 
     @open_transactions.setter
+    @write_locked
     def open_transactions(self, value):
-        self.__open_transactions = value
+        self.__open_transactions = Mempool(value)
+
+    @write_locked
+    def set_hosting_node(self, hosting_node_id):
+        self.hosting_node = hosting_node_id
 
+    @write_locked
     def load_data(self):
+        with _storage_seconds.time(operation='load'):
+            self._load_data()
+
+    def _load_data(self):
         try:
-            with open(Configuration.BLOCKCHAIN_FILE + str(self.network_id), mode='r') as datastore:
-                file_content = datastore.readlines()
-                raw_blockchain_data = json.loads(file_content[0][:-1])
-                self.__chain = [Block(
-                    index=block['index'],
-                    previous_hash=block['previous_hash'],
-                    transactions=[
-                        Transaction(tx['sender'], tx['recipient'], tx['amount'], tx['signature'])
-                        for tx in block['transactions']
-                    ],
-                    proof=block['proof'],
-                    block_time=block['timestamp']
-                ) for block in raw_blockchain_data]
-                raw_open_transactions_data = json.loads(file_content[1][:-1])
-                self.__open_transactions = [
-                    Transaction(tx['sender'], tx['recipient'], tx['amount'], tx['signature'])
-                    for tx in raw_open_transactions_data
-                ]
-                self.__peer_nodes = set(json.loads(file_content[2]))
+            self.storage.open()
+            if self.storage.height > 0:
+                self.__chain = StoredChain(self.storage)
+            self.load_ledger()
+            if self.utxos is not None:
+                self.load_utxos()
+            self.address_index.load(self.__chain)
+            self.__open_transactions = self.mempool_journal.recover()
+            if self.mempool_journal.records:
+                self.save_open_transactions()
+            self.__peer_nodes = set(self.storage.load_peers())
         except (IOError, IndexError):
             print('Error while reading blockchain data, assuming empty chain!')
+        except ValueError:
+            print('Blockchain data is corrupt or inconsistent, refusing to load it!')
+            raise
 
+    def load_ledger(self):
+        ledger_data = self.storage.load_ledger()
+        if ledger_data is not None and 0 < ledger_data['height'] <= len(self.__chain) \
+                and HashUtil.hash_block(self.__chain[ledger_data['height'] - 1]) == ledger_data['tip_hash']:
+            self.ledger = Ledger.from_savable_version(ledger_data)
+            self.__ledger_height = ledger_data['height']
+            for block in self.__chain[ledger_data['height']:]:
+                self.ledger.apply_block(block)
+        else:
+            self.ledger = Ledger()
+            self.ledger.rebuild(self.__chain)
+
+    def load_utxos(self):
+        utxo_data = self.storage.load_utxos()
+        if utxo_data is not None and 0 < utxo_data['height'] <= len(self.__chain) \
+                and HashUtil.hash_block(self.__chain[utxo_data['height'] - 1]) == utxo_data['tip_hash']:
+            self.utxos = UtxoSet.from_savable_version(utxo_data)
+            self.__utxo_height = utxo_data['height']
+            for block in self.__chain[utxo_data['height']:]:
+                self.utxos.apply_block(block)
+        else:
+            self.utxos = UtxoSet()
+            try:
+                self.utxos.rebuild(self.__chain)
+            except ValueError:
+                print('Blockchain holds account transactions and cannot be switched to the UTXO ledger!')
+                raise
+
+    @write_locked
     def save_data(self):
+        self.save_chain()
+        self.save_open_transactions()
+        self.save_peer_nodes()
+
+    def save_chain(self):
+        with _storage_seconds.time(operation='chain'):
+            self._save_chain()
+
+    def _save_chain(self):
+        try:
+            self.__chain.flush()
+            self.address_index.flush()
+            if not 0 <= len(self.__chain) - self.__ledger_height < Configuration.LEDGER_SNAPSHOT_INTERVAL:
+                self._save_ledger()
+            if self.utxos is not None \
+                    and not 0 <= len(self.__chain) - self.__utxo_height < Configuration.UTXO_SNAPSHOT_INTERVAL:
+                self._save_utxos()
+        except IOError:
+            print('Saving failed!')
+
+    def _save_ledger(self):
+        ledger_data = self.ledger.get_savable_version()
+        ledger_data['height'] = len(self.__chain)
+        ledger_data['tip_hash'] = HashUtil.hash_block(self.__chain[-1])
+        self.storage.save_ledger(ledger_data)
+        self.__ledger_height = ledger_data['height']
+
+    def _save_utxos(self):
+        utxo_data = self.utxos.get_savable_version()
+        utxo_data['height'] = len(self.__chain)
+        utxo_data['tip_hash'] = HashUtil.hash_block(self.__chain[-1])
+        self.storage.save_utxos(utxo_data)
+        self.__utxo_height = utxo_data['height']
+
+    def save_open_transactions(self):
+        try:
+            with _storage_seconds.time(operation='mempool'):
+                self.mempool_journal.checkpoint(
+                    [transaction.get_savable_version() for transaction in self.__open_transactions]
+                )
+        except IOError:
+            print('Saving failed!')
+
+    def commit_open_transactions(self):
+        if self.mempool_journal.needs_checkpoint:
+            self.save_open_transactions()
+        else:
+            self.mempool_journal.flush()
+
+    def save_peer_nodes(self):
         try:
-            with open(Configuration.BLOCKCHAIN_FILE + str(self.network_id), mode='w') as datastore:
-                savable_blockchain = [block.get_savable_version() for block in self.__chain]
-                datastore.write(json.dumps(savable_blockchain))
-                datastore.write('\n')
-                savable_transactions = [transaction.get_savable_version() for transaction in self.__open_transactions]
-                datastore.write(json.dumps(savable_transactions))
-                datastore.write('\n')
-                datastore.write(json.dumps(list(self.__peer_nodes)))
+            with _storage_seconds.time(operation='peers'):
+                self.storage.save_peers(list(self.__peer_nodes))
         except IOError:
             print('Saving failed!')
 
-    def proof_of_work(self):
-        last_block = self.__chain[-1]
-        last_hash = HashUtil.hash_block(last_block)
-        proof = 0
-        while not Verification.valid_proof(self.__open_transactions, last_hash, proof):
-            proof += 1
+    def proof_of_work(self, block, cancel=None):
+        prefix = Verification.block_proof_prefix(block)
+        started = perf_counter()
+        proof = self.miner.find_proof(prefix, Verification.proof_target(block.difficulty), cancel)
+        _proof_of_work_seconds.observe(perf_counter() - started, outcome='cancelled' if proof is None else 'found')
+        _proof_attempts.inc(self.miner.current_nonce + (proof is not None))
         return proof
 
+    @staticmethod
+    def next_block_version(last_block):
+        return max(Configuration.BLOCK_VERSION, last_block.version)
+
+    @read_locked
     def get_balance(self, sender=None):
         if sender is None:
             if self.hosting_node is None:
@@ -94,163 +214,466 @@ class Blockchain:
             participant = self.hosting_node
         else:
             participant = sender
-        total_sent = self.calculate_balance(participant) + self.calculate_open_transactions(participant)
-        total_received = self.calculate_balance(participant, tx_type='recipient')
-        return total_received - total_sent
+        return self.ledger.get_balance(participant) - self.__open_transactions.pending_amount(participant)
 
+    @read_locked
     def calculate_balance(self, participant, tx_type='sender'):
-        known_type = None
-        if tx_type in ('sender', 'recipient'):
-            known_type = tx_type
-        if known_type is None:
-            return 0
-        transactions_sums = [[tx.amount for tx in block.transactions if getattr(tx, known_type) == participant]
-                             for block in self.__chain]
-        return reduce(lambda total_sum, current: total_sum + sum(current), transactions_sums, 0)
+        if tx_type == 'sender':
+            return self.ledger.get_sent(participant)
+        if tx_type == 'recipient':
+            return self.ledger.get_received(participant)
+        return 0
 
+    @read_locked
     def calculate_open_transactions(self, participant, tx_type='sender'):
-        known_type = None
-        if tx_type in ('sender', 'recipient'):
-            known_type = tx_type
-        if known_type is None:
-            return 0
-        return sum([tx.amount for tx in self.__open_transactions if getattr(tx, known_type) == participant])
+        if tx_type == 'sender':
+            return self.__open_transactions.pending_amount(participant)
+        return 0
 
     def get_last_blockchain_value(self):
         try:
-            return self.__chain[-1]
+            return self.chain_view.tip
         except IndexError:
             return None
 
-    def mine_block(self):
-        if self.hosting_node is None:
+    def mine_block(self, cancel=None):
+        cancel = threading.Event() if cancel is None else cancel
+        self.__mining_cancel_events.add(cancel)
+        try:
+            with self.lock.reading():
+                hosting_node = self.hosting_node
+                last_block = self.__chain[-1]
+                open_transactions = list(self.__open_transactions)
+                balances = {tx.sender: self.ledger.get_balance(tx.sender) for tx in open_transactions}
+                outputs = None
+                if self.utxos is not None:
+                    outputs = {
+                        outpoint: self.utxos.get(outpoint) for tx in open_transactions for outpoint in tx.inputs
+                    }
+            if hosting_node is None:
+                return None
+            block_transactions, invalid_transactions = self.block_template.select(
+                open_transactions, balances.get, outputs.get if outputs is not None else None
+            )
+            if invalid_transactions:
+                self.drop_open_transactions(invalid_transactions)
+            reward_transaction = Transaction(
+                Configuration.MINING_SENDER,
+                hosting_node,
+                Configuration.MINING_REWARD + sum(tx.fee for tx in block_transactions),
+                ''
+            )
+            candidate = Block(
+                index=last_block.index + 1,
+                previous_hash=HashUtil.hash_block(last_block),
+                transactions=block_transactions + [reward_transaction],
+                proof=0,
+                version=self.next_block_version(last_block)
+            )
+            proof = self.proof_of_work(candidate, cancel)
+        finally:
+            self.__mining_cancel_events.discard(cancel)
+        if proof is None:
             return None
-        last_block = self.__chain[-1]
-        proof = self.proof_of_work()
-        reward_transaction = Transaction(Configuration.MINING_SENDER, self.hosting_node, Configuration.MINING_REWARD,
-                                         '')
-        copied_transactions = self.__open_transactions[:]
-        for tx in copied_transactions:
-            if not Wallet.verify_transaction(tx):
+        block = candidate.with_proof(proof)
+        with self.lock.writing():
+            if self.__chain[-1].hash != last_block.hash:
+                print('Chain tip changed while mining, block discarded!')
                 return None
-        copied_transactions.append(reward_transaction)
-        block = Block(
-            index=len(self.__chain),
-            previous_hash=HashUtil.hash_block(last_block),
-            transactions=copied_transactions,
-            proof=proof
-        )
-        self.__chain.append(block)
-        self.__open_transactions = []
-        self.save_data()
+            self.__chain.append(block)
+            self.ledger.apply_block(block)
+            if self.utxos is not None:
+                self.utxos.apply_block(block)
+            self.address_index.apply_block(block)
+            if self.__open_transactions.remove_many(block.transactions):
+                self.mempool_journal.record_remove(block.transactions)
+            self.save_chain()
+            self.commit_open_transactions()
+        _blocks_added.inc(source='mined')
         if not self.notify_peer_nodes_about_block(block):
             pass
         return block
 
-    def add_transaction(self, recipient, sender, amount, signature, is_receiving=False):
-        transaction = Transaction(sender, recipient, amount, signature)
-        if Verification.verify_transaction(transaction, self.get_balance):
-            self.__open_transactions.append(transaction)
-            self.save_data()
-            if not is_receiving:
-                if not self.notify_peer_nodes_about_transaction(transaction):
-                    return False
-            return True
-        return False
+    @write_locked
+    def drop_open_transactions(self, transactions):
+        if self.__open_transactions.remove_many(transactions):
+            print(f'Dropped {len(transactions)} invalid open transactions!')
+            self.mempool_journal.record_remove(transactions)
 
-    def notify_peer_nodes_about_transaction(self, transaction):
-        for node in self.__peer_nodes:
-            url = f'http://{node}/broadcast-transaction'
-            try:
-                response = requests.post(url, json={'transaction': transaction.to_ordered_dict()})
-                if response.status_code in [400, 500]:
-                    print('Transaction declined, needs resolving')
-                    return False
-            except requests.exceptions.ConnectionError:
+    def cancel_mining(self):
+        for cancel in list(self.__mining_cancel_events):
+            cancel.set()
+
+    def add_transaction(self, recipient, sender, amount, signature, is_receiving=False, fee=0, inputs=()):
+        transaction = Transaction(sender, recipient, amount, signature, fee, inputs)
+        return self.add_transactions([transaction], is_receiving)[0]
+
+    def add_transactions(self, transactions, is_receiving=False):
+        results = [False] * len(transactions)
+        candidates = []
+        digests = set()
+        for position, transaction in enumerate(transactions):
+            if not Verification.valid_fields(transaction):
                 continue
+            if transaction.digest not in digests and transaction not in self.__open_transactions:
+                digests.add(transaction.digest)
+                candidates.append(position)
+        signatures = Wallet.verify_transactions([transactions[position] for position in candidates])
+        candidates = [position for position, is_valid in zip(candidates, signatures) if is_valid]
+        accepted = []
+        with self.lock.writing():
+            if self.utxos is not None:
+                funded = [Verification.valid_inputs(transactions[position], self.utxos.get) for position in candidates]
+            else:
+                funded = Verification.verify_funds(
+                    [transactions[position] for position in candidates], self.get_balance
+                )
+            for position, is_funded in zip(candidates, funded):
+                if is_funded and self.__open_transactions.add(transactions[position]):
+                    accepted.append(transactions[position])
+                    results[position] = True
+            if not accepted:
+                return results
+            sequence = self.mempool_journal.record_add(accepted)
+            if self.mempool_journal.needs_checkpoint:
+                self.save_open_transactions()
+        self.mempool_journal.wait(sequence)
+        if not is_receiving:
+            if len(accepted) == 1:
+                self.notify_peer_nodes_about_transaction(accepted[0])
+            else:
+                self.notify_peer_nodes_about_transactions(accepted)
+        return results
+
+    def notify_peer_nodes_about_transaction(self, transaction):
+        if Configuration.WIRE_FORMAT == 'binary':
+            payload = transaction.to_bytes()
+        else:
+            payload = {'transaction': transaction.to_ordered_dict()}
+        self.gossip.broadcast(
+            list(self.__peer_nodes),
+            '/broadcast-transaction',
+            payload,
+            self.on_transaction_gossip_response
+        )
         return True
 
+    def notify_peer_nodes_about_transactions(self, transactions):
+        if Configuration.WIRE_FORMAT == 'binary':
+            payload = BinaryEncoding.pack_list(transaction.to_bytes() for transaction in transactions)
+        else:
+            payload = {'transactions': [transaction.to_ordered_dict() for transaction in transactions]}
+        self.gossip.broadcast(
+            list(self.__peer_nodes),
+            '/broadcast-transactions',
+            payload,
+            self.on_transaction_gossip_response
+        )
+        return True
+
+    def on_transaction_gossip_response(self, node, response):
+        if response.status_code in [400, 500]:
+            print(f'Transaction declined by {node}, needs resolving')
+
     def add_block(self, block):
-        transactions = [Transaction(tx['sender'], tx['recipient'], tx['amount'], tx['signature'])
-                        for tx in block['transactions']]
-        proof_is_valid = Verification.valid_proof(transactions[:-1], block['previous_hash'], block['proof'])
-        hashes_match = HashUtil.hash_block(self.chain[-1]) == block['previous_hash']
-        if not (proof_is_valid and hashes_match):
+        new_block = block if isinstance(block, Block) else Block.from_savable_version(block)
+        if new_block.difficulty != Configuration.MINING_DIFFICULTY:
             return False
-        new_block = Block(
-            index=block['index'],
-            previous_hash=block['previous_hash'],
-            transactions=transactions,
-            proof=block['proof'],
-            block_time=block['timestamp']
-        )
-        self.__chain.append(new_block)
-        self.clear_open_peer_transactions(block)
-        self.save_data()
+        if not Verification.valid_block_proof(new_block) or not Verification.valid_reward(new_block):
+            return False
+        if not Verification.verify_transactions(new_block.transactions[:-1], self.get_balance):
+            return False
+        with self.lock.writing():
+            last_block = self.__chain[-1]
+            if HashUtil.hash_block(last_block) != new_block.previous_hash \
+                    or not Verification.valid_version(new_block, last_block):
+                return False
+            if self.utxos is not None and not Verification.verify_block_inputs(new_block, self.utxos.get):
+                return False
+            self.__chain.append(new_block)
+            self.ledger.apply_block(new_block)
+            if self.utxos is not None:
+                self.utxos.apply_block(new_block)
+            self.address_index.apply_block(new_block)
+            self.clear_open_peer_transactions(new_block)
+            self.save_chain()
+            self.commit_open_transactions()
+        _blocks_added.inc(source='peer')
+        self.cancel_mining()
         return True
 
     def notify_peer_nodes_about_block(self, block):
-        for node in self.__peer_nodes:
-            url = f'http://{node}/broadcast-block'
-            try:
-                response = requests.post(url, json={'block': block.get_savable_version()})
-                if response.status_code in [400, 500]:
-                    print('Block declined, needs resolving')
-                if response.status_code in [409]:
-                    self.resolve_conflicts = True
-            except requests.exceptions.ConnectionError:
-                continue
+        if Configuration.WIRE_FORMAT == 'binary':
+            payload = block.to_bytes()
+        else:
+            payload = {'block': block.get_savable_version()}
+        self.gossip.broadcast(
+            list(self.__peer_nodes),
+            '/broadcast-block',
+            payload,
+            self.on_block_gossip_response
+        )
         return True
 
+    def on_block_gossip_response(self, node, response):
+        if response.status_code in [400, 500]:
+            print(f'Block declined by {node}, needs resolving')
+        if response.status_code in [409]:
+            self.resolve_conflicts = True
+
+    @write_locked
     def clear_open_peer_transactions(self, block):
-        stored_transactions = self.__open_transactions[:]
-        for incoming_transaction in block['transactions']:
-            for open_transaction in stored_transactions:
-                if open_transaction.sender == incoming_transaction['sender'] \
-                        and open_transaction.recipient == incoming_transaction['recipient'] \
-                        and open_transaction.signature == incoming_transaction['signature']:
-                    try:
-                        self.__open_transactions.remove(open_transaction)
-                    except ValueError:
-                        print('Item already removed!')
+        if self.__open_transactions.remove_many(block.transactions):
+            self.mempool_journal.record_remove(block.transactions)
 
     def resolve(self):
-        winner_chain = self.chain
+        with self.lock.reading():
+            peer_nodes = list(self.__peer_nodes)
+            local_height = len(self.__chain)
         replace = False
-        for node in self.__peer_nodes:
-            url = f'http://{node}/chain'
-            try:
-                response = requests.get(url)
-                node_chain = response.json()
-                node_chain = [Block(
-                    block['index'],
-                    block['previous_hash'],
-                    [Transaction(tx['sender'], tx['recipient'], tx['amount'], tx['signature'])
-                     for tx in block['transactions']],
-                    block['proof'],
-                    block['timestamp']
-                ) for block in node_chain['chain']]
-                node_chain_length = len(node_chain)
-                local_chain_length = len(winner_chain)
-                if node_chain_length > local_chain_length and Verification.verify_chain(node_chain):
-                    winner_chain = node_chain
-                    replace = True
-            except requests.exceptions.ConnectionError:
-                continue
+        if peer_nodes:
+            with ThreadPoolExecutor(max_workers=len(peer_nodes)) as executor:
+                peer_tips = list(executor.map(self.fetch_peer_tip, peer_nodes))
+            candidates = sorted(
+                [(tip['height'], node) for node, tip in zip(peer_nodes, peer_tips)
+                 if tip is not None and tip['height'] > local_height],
+                reverse=True
+            )
+            for peer_height, node in candidates:
+                try:
+                    fork_index = self.find_fork_index(node, peer_height)
+                    suffix = self.fetch_peer_blocks(node, fork_index, peer_height)
+                except (requests.exceptions.RequestException, KeyError, IndexError, TypeError, ValueError):
+                    print(f'Syncing with {node} failed!')
+                    continue
+                if fork_index + len(suffix) <= local_height or not self.verify_chain_suffix(fork_index, suffix):
+                    continue
+                with self.lock.writing():
+                    if fork_index + len(suffix) <= len(self.__chain) \
+                            or (fork_index > 0 and self.__chain[fork_index - 1].hash != suffix[0].previous_hash):
+                        continue
+                    if not self.replace_chain_suffix(fork_index, suffix):
+                        continue
+                    self.__open_transactions = Mempool()
+                    self.save_chain()
+                    self.save_open_transactions()
+                replace = True
+                break
         self.resolve_conflicts = False
-        self.chain = winner_chain
         if replace:
-            self.__open_transactions = []
-        self.save_data()
+            _chain_replacements.inc()
+            self.cancel_mining()
         return replace
 
+    def fetch_peer_tip(self, node):
+        try:
+            response = requests.get(f'http://{node}/chain/tip', timeout=Configuration.SYNC_TIMEOUT)
+            tip = response.json()
+            return {'height': int(tip['height']), 'hash': tip['hash']}
+        except (requests.exceptions.RequestException, KeyError, ValueError, TypeError):
+            return None
+
+    def fetch_peer_range(self, node, resource, start, stop, batch_size, accept=None):
+        items = []
+        while start + len(items) < stop:
+            batch_start = start + len(items)
+            response = requests.get(
+                f'http://{node}/chain/{resource}',
+                params={'from': batch_start, 'to': min(stop, batch_start + batch_size)},
+                headers={'Accept': accept} if accept is not None else None,
+                timeout=Configuration.SYNC_TIMEOUT
+            )
+            if response.headers.get('Content-Type', '').startswith(BinaryEncoding.CONTENT_TYPE):
+                batch = BinaryEncoding.unpack_list(response.content)
+            else:
+                batch = response.json()[resource]
+            if not batch:
+                break
+            items.extend(batch)
+        return items
+
+    def find_fork_index(self, node, peer_height):
+        window = Configuration.SYNC_HEADER_WINDOW
+        chain_view = self.chain_view
+        stop = min(len(chain_view), peer_height)
+        while stop > 0:
+            start = max(0, stop - window)
+            headers = self.fetch_peer_range(node, 'headers', start, stop, Configuration.SYNC_MAX_HEADERS)
+            for header in reversed(headers):
+                if header['hash'] == chain_view[header['index']].hash:
+                    return header['index'] + 1
+            stop = start
+            window *= 2
+        return 0
+
+    def fetch_peer_blocks(self, node, start, stop):
+        if Configuration.WIRE_FORMAT == 'binary':
+            accept = f'{BinaryEncoding.CONTENT_TYPE}, application/json;q=0.5'
+        else:
+            accept = None
+        return [
+            Block.from_bytes(block) if isinstance(block, bytes) else Block.from_savable_version(block)
+            for block in self.fetch_peer_range(node, 'blocks', start, stop, Configuration.SYNC_MAX_BLOCKS, accept)
+        ]
+
+    def verify_chain_suffix(self, fork_index, suffix):
+        if not suffix or suffix[0].index != fork_index:
+            return False
+        if fork_index == 0:
+            return Verification.verify_chain(suffix)
+        return Verification.verify_blocks(suffix, self.chain_view[fork_index - 1])
+
+    @write_locked
+    def replace_chain_suffix(self, fork_index, blocks):
+        if self.utxos is not None and not self.replace_utxos_suffix(fork_index, blocks):
+            return False
+        for block in self.__chain[fork_index:]:
+            self.ledger.revert_block(block)
+        self.address_index.revert_to(fork_index)
+        self.__chain.replace_from(fork_index, blocks)
+        for block in blocks:
+            self.ledger.apply_block(block)
+            self.address_index.apply_block(block)
+        return True
+
+    def replace_utxos_suffix(self, fork_index, blocks):
+        replaced_blocks = self.__chain[fork_index:]
+        try:
+            for block in reversed(replaced_blocks):
+                self.utxos.revert_block(block)
+        except LookupError:
+            print('Unspent outputs cannot be rolled back that far, rebuilding them!')
+            self.utxos.rebuild(self.__chain[:fork_index])
+        applied_blocks = []
+        for block in blocks:
+            if not Verification.verify_block_inputs(block, self.utxos.get):
+                print(f'Block {block.index} spends unavailable outputs, keeping the local chain!')
+                for applied_block in reversed(applied_blocks):
+                    self.utxos.revert_block(applied_block)
+                for replaced_block in replaced_blocks:
+                    self.utxos.apply_block(replaced_block)
+                return False
+            self.utxos.apply_block(block)
+            applied_blocks.append(block)
+        return True
+
+    @read_locked
+    def select_inputs(self, sender, cost, exclude=()):
+        inputs = []
+        input_total = 0
+        for outpoint, amount in self.utxos.get_unspent(sender):
+            if inputs and input_total >= cost:
+                break
+            if outpoint in exclude or self.__open_transactions.spends(outpoint):
+                continue
+            inputs.append(outpoint)
+            input_total += amount
+        return inputs if inputs and input_total >= cost else None
+
+    @read_locked
+    def get_unspent_outputs(self, address):
+        return [
+            {'outpoint': outpoint, 'amount': amount} for outpoint, amount in self.utxos.get_unspent(address)
+            if not self.__open_transactions.spends(outpoint)
+        ]
+
+    @read_locked
+    def get_tip(self):
+        return {'height': len(self.__chain), 'hash': self.__chain[-1].hash}
+
+    def get_headers(self, start, stop):
+        return [block.get_header() for block in self.chain_view.range(start, stop)]
+
+    def get_blocks(self, start, stop):
+        return [block.get_savable_version() for block in self.chain_view.range(start, stop)]
+
+    def get_merkle_proof(self, block_index, transaction_id):
+        block = self.chain_view[block_index]
+        if not block.has_merkle_header:
+            return None
+        for position, transaction in enumerate(block.transactions):
+            if transaction_id in (transaction.digest, transaction.signature):
+                return {
+                    'header': block.get_header(),
+                    'transaction': transaction.to_ordered_dict(),
+                    'encoded_transaction': transaction.to_bytes().hex(),
+                    'position': position,
+                    'leaf': block.merkle_leaves[position].hex(),
+                    'path': [{'side': side, 'hash': sibling.hex()} for side, sibling in block.merkle_proof(position)]
+                }
+        return None
+
+    def get_encoded_blocks(self, start, stop):
+        return BinaryEncoding.pack_list(block.to_bytes() for block in self.chain_view.range(start, stop))
+
+    def get_address_transactions(self, address, start, stop):
+        chain_view = self.chain_view
+        while True:
+            generation = self.address_index.generation
+            transactions = []
+            try:
+                for block_index, position in self.address_index.get_history(address, start, stop):
+                    block = chain_view[block_index]
+                    transactions.append({
+                        'block': block_index,
+                        'position': position,
+                        'timestamp': block.timestamp,
+                        'transaction': block.transactions[position].to_ordered_dict()
+                    })
+            except IndexError:
+                if generation == self.address_index.generation:
+                    raise
+                continue
+            if generation == self.address_index.generation:
+                return transactions
+
+    def get_address_transactions_count(self, address):
+        return self.address_index.count(address)
+
+    @read_locked
+    def get_open_transactions(self, start, stop):
+        return [tx.to_ordered_dict() for tx in self.__open_transactions.slice(start, stop)]
+
+    def iter_open_transactions(self, batch_size=None):
+        batch_size = Configuration.TRANSACTIONS_BATCH_SIZE if batch_size is None else batch_size
+        with self.lock.reading():
+            digests = self.__open_transactions.digests()
+        for start in range(0, len(digests), batch_size):
+            with self.lock.reading():
+                transactions = self.__open_transactions.get_many(digests[start:start + batch_size])
+            yield from transactions
+
+    @read_locked
+    def get_open_transactions_count(self):
+        return len(self.__open_transactions)
+
+    @write_locked
     def add_peer_node(self, node):
         self.__peer_nodes.add(node)
-        self.save_data()
+        self.save_peer_nodes()
 
+    @write_locked
     def remove_peer_node(self, node):
         self.__peer_nodes.discard(node)
-        self.save_data()
+        self.save_peer_nodes()
 
+    @read_locked
     def get_peer_nodes(self):
         return list(self.__peer_nodes)
+
+    @write_locked
+    def save_snapshots(self):
+        try:
+            self._save_ledger()
+            if self.utxos is not None:
+                self._save_utxos()
+            self.address_index.save_snapshot()
+        except IOError:
+            print('Saving failed!')
+
+    def close(self):
+        self.miner.close()
+        self.gossip.stop()
+        self.mempool_journal.stop()
+        self.save_snapshots()
+        self.storage.close()
@@ -3,3 +3,48 @@ class Configuration:
     WALLET_FILE = 'data/wallet.dat'
     MINING_REWARD = 10
     MINING_SENDER = 'ABYSS'
+    MINING_WORKERS = 1
+    MINING_DIFFICULTY = 2
+    STORAGE_SEGMENT_BLOCKS = 1000
+    BLOCK_CACHE_SIZE = 256
+    VERIFICATION_WORKERS = 1
+    PARALLEL_VERIFICATION_THRESHOLD = 64
+    PUBLIC_KEY_CACHE_SIZE = 1024
+    SIGNATURE_CACHE_SIZE = 65536
+    GOSSIP_TIMEOUT = 5
+    GOSSIP_QUEUE_SIZE = 1000
+    GOSSIP_RETRIES = 3
+    GOSSIP_BACKOFF = 0.5
+    SYNC_TIMEOUT = 10
+    SYNC_HEADER_WINDOW = 64
+    SYNC_MAX_HEADERS = 2000
+    SYNC_MAX_BLOCKS = 200
+    CHAIN_PAGE_SIZE = 100
+    TRANSACTIONS_PAGE_SIZE = 500
+    MEMPOOL_MAX_SIZE = 10000
+    MEMPOOL_EVICTION = 'oldest'
+    SERVER_THREADS = 8
+    MINING_RETRY_DELAY = 1
+    MINING_STATS_HISTORY = 100
+    BLOCK_VERSION = 1
+    SUPPORTED_BLOCK_VERSIONS = (1, 2, 3)
+    WIRE_FORMAT = 'json'
+    BLOCK_MAX_TRANSACTIONS = 1000
+    BLOCK_MAX_BYTES = 1000000
+    ADDRESS_PAGE_SIZE = 100
+    ADDRESS_CACHE_SIZE = 1024
+    PROFILER_ENABLED = False
+    PROFILER_INTERVAL = 0.01
+    MEMPOOL_DURABILITY = 'batch'
+    MEMPOOL_COMMIT_WINDOW = 0.005
+    MEMPOOL_COMMIT_BATCH = 256
+    MEMPOOL_JOURNAL_MAX_RECORDS = 10000
+    TRANSACTIONS_BATCH_SIZE = 1000
+    KEY_SCHEME = 'rsa'
+    LEDGER_MODE = 'account'
+    UTXO_UNDO_DEPTH = 100
+    UTXO_SNAPSHOT_INTERVAL = 100
+    LEDGER_SNAPSHOT_INTERVAL = 100
+    PROCESS_START_METHOD = 'forkserver'
+    PARALLEL_MINING_THRESHOLD = 65536
+    ADDRESS_SNAPSHOT_INTERVAL = 100
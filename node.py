@@ -1,12 +1,45 @@
-from flask import Flask, jsonify, request, send_from_directory
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from flask import Flask, Response, g, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
 from argparse import ArgumentParser
 
 from wallet import Wallet
 from blockchain import Blockchain
+from utilities.mining_service import MiningService
+from utilities.mempool_journal import MempoolJournal
+from utilities.encoding import BinaryEncoding
+from utilities.metrics import REGISTRY, MetricsRegistry
+from utilities.profiler import SamplingProfiler
+from utilities.verification import Verification
+from block import Block
+from transaction import Transaction
+from configuration import Configuration
 
 app = Flask(__name__)
 CORS(app)
+wallet_lock = threading.Lock()
+mining_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mining')
+profiler = None
+request_seconds = REGISTRY.histogram('http_request_seconds', 'Time spent handling HTTP requests.',
+                                     ['method', 'route', 'status'])
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = perf_counter()
+
+
+@app.after_request
+def observe_request_time(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_seconds.observe(perf_counter() - started, method=request.method, route=route,
+                                status=str(response.status_code))
+    return response
 
 
 @app.route('/', methods=['GET'])
@@ -42,16 +75,36 @@ def add_transaction():
             'message': 'Required data is missing!'
         }
         return jsonify(response), 400
+    fee = user_data.get('fee', 0)
+    if not Verification.valid_amounts(user_data['amount'], fee):
+        response = {
+            'success': False,
+            'message': 'Amount must be a positive number and fee a non-negative number!'
+        }
+        return jsonify(response), 400
+    inputs = []
+    if blockchain.utxos is not None:
+        inputs = blockchain.select_inputs(wallet.public_key, user_data['amount'] + fee)
+        if inputs is None:
+            response = {
+                'success': False,
+                'message': 'Insufficient funds!'
+            }
+            return jsonify(response), 400
     signature = wallet.sign_transaction(
         wallet.public_key,
         user_data['recipient'],
-        user_data['amount']
+        user_data['amount'],
+        fee,
+        inputs
     )
     success = blockchain.add_transaction(
         user_data['recipient'],
         wallet.public_key,
         user_data['amount'],
-        signature
+        signature,
+        fee=fee,
+        inputs=inputs
     )
     if success:
         response = {
@@ -61,10 +114,13 @@ def add_transaction():
                 'sender': wallet.public_key,
                 'recipient': user_data['recipient'],
                 'amount': user_data['amount'],
-                'signature': signature
+                'signature': signature,
+                'fee': fee
             },
             'balance': blockchain.get_balance()
         }
+        if inputs:
+            response['transaction']['inputs'] = inputs
         return jsonify(response), 201
     else:
         response = {
@@ -74,16 +130,102 @@ def add_transaction():
         return jsonify(response), 500
 
 
+@app.route('/transactions/batch', methods=['POST'])
+def add_transactions():
+    if wallet.public_key is None:
+        response = {
+            'success': False,
+            'message': 'No wallet set up!',
+            'wallet_set_up': False
+        }
+        return jsonify(response), 400
+    user_data = request.get_json(silent=True)
+    if not user_data or not isinstance(user_data.get('transactions'), list) or not user_data['transactions']:
+        response = {
+            'success': False,
+            'message': 'No input data!'
+        }
+        return jsonify(response), 400
+    if len(user_data['transactions']) > Configuration.TRANSACTIONS_BATCH_SIZE:
+        response = {
+            'success': False,
+            'message': f'At most {Configuration.TRANSACTIONS_BATCH_SIZE} transactions can be sent at once!'
+        }
+        return jsonify(response), 413
+    results = [None] * len(user_data['transactions'])
+    positions = []
+    transactions = []
+    selected_inputs = set()
+    for position, item in enumerate(user_data['transactions']):
+        if not isinstance(item, dict) or not all(field in item for field in ['recipient', 'amount']):
+            results[position] = {
+                'success': False,
+                'message': 'Required data is missing!'
+            }
+            continue
+        fee = item.get('fee', 0)
+        if not Verification.valid_amounts(item['amount'], fee):
+            results[position] = {
+                'success': False,
+                'message': 'Amount must be a positive number and fee a non-negative number!'
+            }
+            continue
+        inputs = []
+        if blockchain.utxos is not None:
+            inputs = blockchain.select_inputs(wallet.public_key, item['amount'] + fee, selected_inputs)
+            if inputs is None:
+                results[position] = {
+                    'success': False,
+                    'message': 'Insufficient funds!'
+                }
+                continue
+            selected_inputs.update(inputs)
+        signature = wallet.sign_transaction(wallet.public_key, item['recipient'], item['amount'], fee, inputs)
+        positions.append(position)
+        transactions.append(
+            Transaction(wallet.public_key, item['recipient'], item['amount'], signature, fee, inputs)
+        )
+    for position, transaction, success in zip(positions, transactions, blockchain.add_transactions(transactions)):
+        if success:
+            results[position] = {
+                'success': True,
+                'transaction': transaction.to_ordered_dict()
+            }
+        else:
+            results[position] = {
+                'success': False,
+                'message': 'Creating a transaction failed!'
+            }
+    created = sum(1 for result in results if result['success'])
+    response = {
+        'success': created > 0,
+        'message': f'{created} of {len(results)} transactions successfully created!',
+        'results': results,
+        'balance': blockchain.get_balance()
+    }
+    return jsonify(response), 201 if created else 500
+
+
 @app.route('/wallet', methods=['POST'])
 def create_keys():
-    wallet.create_keys()
-    if wallet.save_keys():
-        global blockchain
-        blockchain = Blockchain(wallet.public_key, network_id=port)
+    scheme = (request.get_json(silent=True) or {}).get('scheme')
+    if scheme is not None and scheme not in Wallet.KEY_SCHEMES:
+        response = {
+            'success': False,
+            'message': f'Unknown key scheme, expected one of {", ".join(Wallet.KEY_SCHEMES)}!'
+        }
+        return jsonify(response), 400
+    with wallet_lock:
+        wallet.create_keys(scheme)
+        wallet_saved = wallet.save_keys()
+        if wallet_saved:
+            blockchain.set_hosting_node(wallet.public_key)
+    if wallet_saved:
         response = {
             'success': True,
             'public_key': wallet.public_key,
             'private_key': wallet.private_key,
+            'scheme': wallet.scheme,
             'balance': blockchain.get_balance()
         }
         return jsonify(response), 201
@@ -97,13 +239,16 @@ def create_keys():
 
 @app.route('/wallet', methods=['GET'])
 def load_keys():
-    if wallet.load_keys():
-        global blockchain
-        blockchain = Blockchain(wallet.public_key, network_id=port)
+    with wallet_lock:
+        wallet_loaded = wallet.load_keys()
+        if wallet_loaded:
+            blockchain.set_hosting_node(wallet.public_key)
+    if wallet_loaded:
         response = {
             'success': True,
             'public_key': wallet.public_key,
             'private_key': wallet.private_key,
+            'scheme': wallet.scheme,
             'balance': blockchain.get_balance()
         }
         return jsonify(response), 201
@@ -141,7 +286,7 @@ def mine():
             'message': 'Resolve conflicts first! Block not added!'
         }
         return jsonify(response), 409
-    block = blockchain.mine_block()
+    block = mining_executor.submit(blockchain.mine_block).result()
     if block is not None:
         response = {
             'success': True,
@@ -159,6 +304,56 @@ def mine():
         return jsonify(response), 500
 
 
+@app.route('/mining/start', methods=['POST'])
+def start_mining():
+    if wallet.public_key is None:
+        response = {
+            'success': False,
+            'message': 'No wallet set up!',
+            'wallet_set_up': False
+        }
+        return jsonify(response), 400
+    if mining_service.start():
+        response = {
+            'success': True,
+            'message': 'Mining started!',
+            'status': mining_service.get_status()
+        }
+        return jsonify(response), 201
+    response = {
+        'success': False,
+        'message': 'Mining is already running!',
+        'status': mining_service.get_status()
+    }
+    return jsonify(response), 409
+
+
+@app.route('/mining/stop', methods=['POST'])
+def stop_mining():
+    if mining_service.stop():
+        response = {
+            'success': True,
+            'message': 'Mining stopped!',
+            'status': mining_service.get_status()
+        }
+        return jsonify(response), 200
+    response = {
+        'success': False,
+        'message': 'Mining is not running!',
+        'status': mining_service.get_status()
+    }
+    return jsonify(response), 409
+
+
+@app.route('/mining/status', methods=['GET'])
+def get_mining_status():
+    response = {
+        'success': True,
+        'status': mining_service.get_status()
+    }
+    return jsonify(response), 200
+
+
 @app.route('/resolve-conflicts', methods=['POST'])
 def resolve_conflicts():
     if blockchain.resolve():
@@ -176,20 +371,184 @@ def resolve_conflicts():
 
 @app.route('/chain', methods=['GET'])
 def get_chain():
-    chain = blockchain.chain
+    if 'from' not in request.args and 'limit' not in request.args:
+        return stream_json_list('chain', (block.get_savable_version() for block in blockchain.chain_view))
+    start, stop = get_requested_page(Configuration.CHAIN_PAGE_SIZE)
+    chain_view = blockchain.chain_view
+    height = len(chain_view)
+    response = {
+        'success': True,
+        'chain': [block.get_savable_version() for block in chain_view.range(start, stop)],
+        'from': start,
+        'next': stop if stop < height else None,
+        'height': height
+    }
+    return jsonify(response), 200
+
+
+@app.route('/chain/tip', methods=['GET'])
+def get_chain_tip():
+    tip = blockchain.get_tip()
+    response = {
+        'success': True,
+        'height': tip['height'],
+        'hash': tip['hash']
+    }
+    return jsonify(response), 200
+
+
+@app.route('/chain/headers', methods=['GET'])
+def get_chain_headers():
+    start, stop = get_requested_range(Configuration.SYNC_MAX_HEADERS)
+    response = {
+        'success': True,
+        'headers': blockchain.get_headers(start, stop)
+    }
+    return jsonify(response), 200
+
+
+@app.route('/chain/blocks', methods=['GET'])
+def get_chain_blocks():
+    start, stop = get_requested_range(Configuration.SYNC_MAX_BLOCKS)
+    if accepts_binary():
+        return Response(blockchain.get_encoded_blocks(start, stop), mimetype=BinaryEncoding.CONTENT_TYPE)
+    response = {
+        'success': True,
+        'blocks': blockchain.get_blocks(start, stop)
+    }
+    return jsonify(response), 200
+
+
+@app.route('/merkle-proof', methods=['GET'])
+def get_merkle_proof():
+    block_index = request.args.get('block', type=int)
+    transaction_id = request.args.get('transaction')
+    if block_index is None or not transaction_id:
+        response = {
+            'success': False,
+            'message': 'Required data is missing!'
+        }
+        return jsonify(response), 400
+    if not 0 <= block_index < blockchain.get_tip()['height']:
+        response = {
+            'success': False,
+            'message': 'No block found!'
+        }
+        return jsonify(response), 404
+    proof = blockchain.get_merkle_proof(block_index, transaction_id)
+    if proof is None:
+        response = {
+            'success': False,
+            'message': 'Transaction not found in a block with a Merkle header!'
+        }
+        return jsonify(response), 404
     response = {
         'success': True,
-        'chain': [block.get_savable_version() for block in chain]
+        'proof': proof
     }
     return jsonify(response), 200
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(REGISTRY.render(), content_type=MetricsRegistry.CONTENT_TYPE)
+
+
+@app.route('/debug/profile', methods=['GET'])
+def get_profile():
+    if profiler is None:
+        response = {
+            'success': False,
+            'message': 'Profiler is disabled, start the node with --profile!'
+        }
+        return jsonify(response), 404
+    stacks = profiler.collapsed(request.args.get('limit', type=int))
+    if request.args.get('reset', default=0, type=int):
+        profiler.reset()
+    return Response(stacks, content_type='text/plain; charset=utf-8')
+
+
+def register_node_gauges():
+    REGISTRY.gauge('blockchain_height', 'Number of blocks in the local chain.',
+                   function=lambda: blockchain.get_tip()['height'])
+    REGISTRY.gauge('mempool_transactions', 'Number of open transactions.',
+                   function=blockchain.get_open_transactions_count)
+    REGISTRY.gauge('peer_nodes', 'Number of known peer nodes.', function=lambda: len(blockchain.get_peer_nodes()))
+    REGISTRY.gauge('mining_hashrate', 'Hashes per second of the current proof of work search.',
+                   function=lambda: blockchain.miner.hashrate)
+
+
+def accepts_binary():
+    return request.accept_mimetypes.best_match(['application/json', BinaryEncoding.CONTENT_TYPE]) \
+        == BinaryEncoding.CONTENT_TYPE
+
+
+def sent_binary():
+    return request.mimetype == BinaryEncoding.CONTENT_TYPE
+
+
+def get_requested_range(max_items):
+    start = max(0, request.args.get('from', default=0, type=int))
+    stop = request.args.get('to', default=start + max_items, type=int)
+    return start, max(start, min(stop, start + max_items))
+
+
+def get_requested_page(max_items):
+    start = max(0, request.args.get('from', default=0, type=int))
+    limit = min(max(1, request.args.get('limit', default=max_items, type=int)), max_items)
+    return start, start + limit
+
+
+def stream_json_list(key, items):
+    def generate():
+        yield '{"success": true, "' + key + '": ['
+        for position, item in enumerate(items):
+            yield (', ' if position else '') + json.dumps(item)
+        yield ']}'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
 @app.route('/transactions', methods=['GET'])
 def get_open_transactions():
-    transactions = [tx.to_ordered_dict() for tx in blockchain.open_transactions]
+    if 'from' not in request.args and 'limit' not in request.args:
+        return stream_json_list('transactions', (tx.to_ordered_dict() for tx in blockchain.iter_open_transactions()))
+    start, stop = get_requested_page(Configuration.TRANSACTIONS_PAGE_SIZE)
+    total = blockchain.get_open_transactions_count()
+    response = {
+        'success': True,
+        'transactions': blockchain.get_open_transactions(start, stop),
+        'from': start,
+        'next': stop if stop < total else None,
+        'total': total
+    }
+    return jsonify(response), 200
+
+
+@app.route('/address/<address>/transactions', methods=['GET'])
+def get_address_transactions(address):
+    start, stop = get_requested_page(Configuration.ADDRESS_PAGE_SIZE)
+    total = blockchain.get_address_transactions_count(address)
+    response = {
+        'success': True,
+        'transactions': blockchain.get_address_transactions(address, start, stop),
+        'from': start,
+        'next': stop if stop < total else None,
+        'total': total
+    }
+    return jsonify(response), 200
+
+
+@app.route('/address/<address>/unspent', methods=['GET'])
+def get_unspent_outputs(address):
+    if blockchain.utxos is None:
+        response = {
+            'success': False,
+            'message': 'Node is not running in UTXO mode!'
+        }
+        return jsonify(response), 404
     response = {
         'success': True,
-        'transactions': transactions
+        'outputs': blockchain.get_unspent_outputs(address)
     }
     return jsonify(response), 200
 
@@ -247,7 +606,13 @@ def get_nodes():
 
 @app.route('/broadcast-transaction', methods=['POST'])
 def broadcast_transaction():
-    data = request.get_json()
+    if sent_binary():
+        try:
+            data = {'transaction': Transaction.from_bytes(request.get_data()).to_ordered_dict()}
+        except (ValueError, UnicodeDecodeError):
+            data = None
+    else:
+        data = request.get_json(silent=True)
     if not data:
         response = {
             'success': False,
@@ -266,7 +631,9 @@ def broadcast_transaction():
         transaction['sender'],
         transaction['amount'],
         transaction['signature'],
-        is_receiving=True
+        is_receiving=True,
+        fee=transaction.get('fee', 0),
+        inputs=transaction.get('inputs', ())
     )
     if success:
         response = {
@@ -276,7 +643,8 @@ def broadcast_transaction():
                 'sender': transaction['sender'],
                 'recipient': transaction['recipient'],
                 'amount': transaction['amount'],
-                'signature': transaction['signature']
+                'signature': transaction['signature'],
+                'fee': transaction.get('fee', 0)
             },
         }
         return jsonify(response), 201
@@ -288,9 +656,47 @@ def broadcast_transaction():
         return jsonify(response), 500
 
 
+@app.route('/broadcast-transactions', methods=['POST'])
+def broadcast_transactions():
+    try:
+        if sent_binary():
+            transactions = [Transaction.from_bytes(item) for item in BinaryEncoding.unpack_list(request.get_data())]
+        else:
+            data = request.get_json(silent=True) or {}
+            transactions = [Transaction.from_savable_version(item) for item in data.get('transactions', [])]
+    except (ValueError, UnicodeDecodeError, KeyError, TypeError):
+        transactions = None
+    if not transactions:
+        response = {
+            'success': False,
+            'message': 'No data found!'
+        }
+        return jsonify(response), 400
+    if len(transactions) > Configuration.TRANSACTIONS_BATCH_SIZE:
+        response = {
+            'success': False,
+            'message': f'At most {Configuration.TRANSACTIONS_BATCH_SIZE} transactions can be sent at once!'
+        }
+        return jsonify(response), 413
+    results = blockchain.add_transactions(transactions, is_receiving=True)
+    added = sum(results)
+    response = {
+        'success': added > 0,
+        'message': f'{added} of {len(results)} transactions successfully added!',
+        'results': results
+    }
+    return jsonify(response), 201 if added else 500
+
+
 @app.route('/broadcast-block', methods=['POST'])
 def broadcast_block():
-    data = request.get_json()
+    if sent_binary():
+        try:
+            data = {'block': Block.from_bytes(request.get_data())}
+        except (ValueError, UnicodeDecodeError):
+            data = None
+    else:
+        data = request.get_json(silent=True)
     if not data:
         response = {
             'success': False,
@@ -304,7 +710,10 @@ def broadcast_block():
         }
         return jsonify(response), 400
     block = data['block']
-    if block['index'] == blockchain.chain[-1].index + 1:
+    if not isinstance(block, Block):
+        block = Block.from_savable_version(block)
+    tip = blockchain.chain_view.tip
+    if block.index == tip.index + 1:
         if blockchain.add_block(block):
             response = {
                 'success': True,
@@ -317,7 +726,7 @@ def broadcast_block():
                 'message': 'Block seems invalid!'
             }
             return jsonify(response), 409
-    elif block['index'] > blockchain.chain[-1].index:
+    elif block.index > tip.index:
         response = {
             'success': False,
             'message': 'Blockchain differs from local blockchain, block not added!'
@@ -335,8 +744,42 @@ def broadcast_block():
 if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('-p', '--port', type=int, default=5000)
+    parser.add_argument('-w', '--workers', type=int, default=Configuration.MINING_WORKERS)
+    parser.add_argument('--verification-workers', type=int, default=Configuration.VERIFICATION_WORKERS)
+    parser.add_argument('-t', '--threads', type=int, default=Configuration.SERVER_THREADS)
+    parser.add_argument('--profile', action='store_true', default=Configuration.PROFILER_ENABLED)
+    parser.add_argument('--key-scheme', choices=Wallet.KEY_SCHEMES, default=Configuration.KEY_SCHEME)
+    parser.add_argument('--ledger-mode', choices=['account', 'utxo'], default=Configuration.LEDGER_MODE)
+    parser.add_argument('--mempool-durability', choices=MempoolJournal.MODES, default=Configuration.MEMPOOL_DURABILITY)
+    parser.add_argument('--block-version', type=int, choices=Configuration.SUPPORTED_BLOCK_VERSIONS,
+                        default=Configuration.BLOCK_VERSION)
+    parser.add_argument('--wire-format', choices=['json', 'binary'], default=Configuration.WIRE_FORMAT)
     args = parser.parse_args()
     port = args.port
+    Configuration.VERIFICATION_WORKERS = args.verification_workers
+    Configuration.PROFILER_ENABLED = args.profile
+    Configuration.MEMPOOL_DURABILITY = args.mempool_durability
+    Configuration.KEY_SCHEME = args.key_scheme
+    Configuration.LEDGER_MODE = args.ledger_mode
+    Configuration.BLOCK_VERSION = args.block_version
+    Configuration.WIRE_FORMAT = args.wire_format
     wallet = Wallet(network_id=port)
-    blockchain = Blockchain(wallet.public_key, network_id=port)
-    app.run(host='0.0.0.0', port=port)
+    blockchain = Blockchain(wallet.public_key, network_id=port, mining_workers=args.workers)
+    mining_service = MiningService(blockchain)
+    register_node_gauges()
+    if Configuration.PROFILER_ENABLED:
+        profiler = SamplingProfiler(Configuration.PROFILER_INTERVAL)
+        profiler.start()
+    try:
+        from waitress import serve
+    except ImportError:
+        print('Waitress is not installed, falling back to the threaded development server!')
+        serve = None
+    try:
+        if serve is None:
+            app.run(host='0.0.0.0', port=port, threaded=True)
+        else:
+            serve(app, host='0.0.0.0', port=port, threads=args.threads)
+    finally:
+        mining_service.stop()
+        blockchain.close()
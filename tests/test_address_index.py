@@ -0,0 +1,146 @@
+"""Address histories come from per-address posting chains and survive reloads, reorgs and torn writes."""
+
+import os
+import sys
+import tempfile
+import unittest
+from collections import namedtuple
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from configuration import Configuration  # noqa: E402
+from utilities.address_index import AddressIndex  # noqa: E402
+from utilities.storage import ChainStorage  # noqa: E402
+
+FakeTransaction = namedtuple('FakeTransaction', ['sender', 'recipient'])
+FakeBlock = namedtuple('FakeBlock', ['index', 'hash', 'transactions'])
+ADDRESSES = ['alice', 'bob', 'carol', 'dave']
+
+
+def make_chain(length, branch='main'):
+    chain = [FakeBlock(0, 'genesis', ())]
+    for index in range(1, length):
+        transactions = [
+            FakeTransaction(ADDRESSES[(index + offset) % len(ADDRESSES)], ADDRESSES[(index * offset) % len(ADDRESSES)])
+            for offset in range(index % 3)
+        ]
+        transactions.append(FakeTransaction(Configuration.MINING_SENDER, f'{branch}-miner'))
+        chain.append(FakeBlock(index, f'{branch}-{index}', tuple(transactions)))
+    return chain
+
+
+def reference_history(chain, address):
+    return [
+        (block.index, position) for block in chain for position, tx in enumerate(block.transactions)
+        if address in (tx.sender, tx.recipient)
+    ]
+
+
+class AddressIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.storage = ChainStorage(os.path.join(self.directory.name, 'blockchain.dat'))
+        self.snapshot_interval = Configuration.ADDRESS_SNAPSHOT_INTERVAL
+        Configuration.ADDRESS_SNAPSHOT_INTERVAL = 5
+        self.addCleanup(setattr, Configuration, 'ADDRESS_SNAPSHOT_INTERVAL', self.snapshot_interval)
+
+    def new_index(self, chain):
+        index = AddressIndex(self.storage)
+        index.load(chain)
+        return index
+
+    def assert_histories(self, index, chain):
+        self.assertEqual(len(index), len(chain))
+        for address in ADDRESSES + ['main-miner', 'fork-miner', 'nobody']:
+            self.assertEqual(index.get_history(address, 0, None), reference_history(chain, address), address)
+            self.assertEqual(index.count(address), len(reference_history(chain, address)), address)
+
+    def grow(self, index, chain, start, flush_every=3):
+        for block in chain[start:]:
+            index.apply_block(block)
+            if block.index % flush_every == 0:
+                index.flush()
+
+    def test_histories_follow_applied_and_flushed_blocks(self):
+        chain = make_chain(23)
+        index = self.new_index(chain[:1])
+        self.assertEqual(index.get_history('alice', 0, None), [])
+        self.grow(index, chain, 1)
+        self.assert_histories(index, chain)
+        index.flush()
+        self.assert_histories(index, chain)
+        self.assertEqual(index.get_history('bob', 2, 5), reference_history(chain, 'bob')[2:5])
+
+    def test_lookup_reads_only_the_address_records(self):
+        chain = make_chain(40)
+        index = self.new_index(chain)
+        chains_read = []
+        read_address_log_chain = self.storage.read_address_log_chain
+
+        def counting_read(offset, link):
+            records = read_address_log_chain(offset, link)
+            chains_read.append(records)
+            return records
+
+        self.storage.read_address_log_chain = counting_read
+        history = index.get_history('carol', 0, None)
+        self.assertEqual(len(chains_read), 1)
+        self.assertEqual(len(chains_read[0]), len({block_index for block_index, _ in history}))
+        self.assertTrue(all(record['address'] == 'carol' for record in chains_read[0]))
+        index.count('carol')
+        self.assertEqual(len(chains_read), 1)
+
+    def test_reload_uses_the_snapshot_and_replays_later_records(self):
+        chain = make_chain(28)
+        index = self.new_index(chain[:1])
+        self.grow(index, chain, 1, flush_every=1)
+        snapshot = self.storage.load_address_heads()
+        self.assertEqual(snapshot['height'], 25)
+        self.assertLess(snapshot['size'], self.storage.address_log_size())
+        self.assert_histories(self.new_index(chain), chain)
+
+    def test_revert_restores_earlier_heads(self):
+        chain = make_chain(30)
+        fork = chain[:12] + make_chain(35, branch='fork')[12:]
+        index = self.new_index(chain[:1])
+        self.grow(index, chain, 1)
+        index.flush()
+        index.get_history('alice', 0, None)
+        index.revert_to(12)
+        self.assert_histories(index, chain[:12])
+        self.grow(index, fork, 12)
+        self.assert_histories(index, fork)
+        index.flush()
+        self.assert_histories(self.new_index(fork), fork)
+
+    def test_revert_of_unsaved_blocks(self):
+        chain = make_chain(15)
+        fork = chain[:12] + make_chain(16, branch='fork')[12:]
+        index = self.new_index(chain[:10])
+        self.grow(index, chain, 10, flush_every=100)
+        index.revert_to(12)
+        self.grow(index, fork, 12, flush_every=100)
+        self.assert_histories(index, fork)
+
+    def test_load_drops_torn_and_stale_records(self):
+        chain = make_chain(20)
+        self.new_index(chain)
+        size = self.storage.address_log_size()
+        with open(self.storage.addresses_path, mode='ab') as datastore:
+            datastore.write(b'{"address": "alice", "index": 20, "posi')
+        self.assert_histories(self.new_index(chain), chain)
+        self.assertEqual(self.storage.address_log_size(), size)
+        self.assert_histories(self.new_index(chain[:14]), chain[:14])
+        self.assert_histories(self.new_index(chain), chain)
+
+    def test_load_without_a_snapshot_rebuilds_the_heads(self):
+        chain = make_chain(20)
+        self.new_index(chain)
+        os.remove(self.storage.address_heads_path)
+        self.assert_histories(self.new_index(chain), chain)
+
+
+if __name__ == '__main__':
+    unittest.main()
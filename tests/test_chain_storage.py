@@ -0,0 +1,134 @@
+"""Block storage recovers a consistent prefix after torn writes and truncates suffixes cleanly."""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from utilities.storage import ChainStorage  # noqa: E402
+
+SEGMENT_SIZE = 3
+BLOCK_COUNT = 8
+
+
+def make_block(index):
+    return {'index': index, 'previous_hash': f'hash-{index - 1}', 'transactions': [], 'proof': index}
+
+
+class ChainStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.base_path = os.path.join(self.directory.name, 'blockchain.dat')
+        storage = self.open_storage()
+        storage.append_blocks(make_block(index) for index in range(BLOCK_COUNT))
+        storage.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_storage(self):
+        storage = ChainStorage(self.base_path, segment_size=SEGMENT_SIZE)
+        storage.open()
+        self.addCleanup(storage.close)
+        return storage
+
+    def segment_path(self, segment):
+        return os.path.join(self.base_path + '.blocks', ChainStorage.SEGMENT_NAME.format(segment))
+
+    def index_path(self):
+        return os.path.join(self.base_path + '.blocks', ChainStorage.INDEX_NAME)
+
+    def append_bytes(self, path, data):
+        with open(path, mode='ab') as datastore:
+            datastore.write(data)
+
+    def cut_bytes(self, path, count):
+        with open(path, mode='r+b') as datastore:
+            datastore.truncate(os.path.getsize(path) - count)
+
+    def assert_recovered(self, storage, height):
+        self.assertEqual(storage.height, height)
+        self.assertEqual([storage.read_block(index) for index in range(storage.height)],
+                         [make_block(index) for index in range(height)])
+        with self.assertRaises(IndexError):
+            storage.read_block(height)
+        reopened = self.open_storage()
+        self.assertEqual(reopened.height, height)
+
+    def test_reopen_keeps_all_blocks(self):
+        self.assert_recovered(self.open_storage(), BLOCK_COUNT)
+
+    def test_partial_segment_line_is_dropped(self):
+        last_segment = (BLOCK_COUNT - 1) // SEGMENT_SIZE
+        size = os.path.getsize(self.segment_path(last_segment))
+        self.append_bytes(self.segment_path(last_segment), b'{"index": 8, "previous')
+        storage = self.open_storage()
+        self.assert_recovered(storage, BLOCK_COUNT)
+        self.assertEqual(os.path.getsize(self.segment_path(last_segment)), size)
+        storage.append_blocks([make_block(BLOCK_COUNT)])
+        self.assert_recovered(storage, BLOCK_COUNT + 1)
+
+    def test_index_behind_segments_is_rebuilt(self):
+        last_segment = (BLOCK_COUNT - 1) // SEGMENT_SIZE
+        self.append_bytes(self.segment_path(last_segment), (json.dumps(make_block(BLOCK_COUNT)) + '\n').encode())
+        self.assert_recovered(self.open_storage(), BLOCK_COUNT + 1)
+
+    def test_index_ahead_of_segments_is_rebuilt(self):
+        last_segment = (BLOCK_COUNT - 1) // SEGMENT_SIZE
+        self.cut_bytes(self.segment_path(last_segment), 1)
+        self.assert_recovered(self.open_storage(), BLOCK_COUNT - 1)
+
+    def test_torn_index_record_is_rebuilt(self):
+        self.cut_bytes(self.index_path(), ChainStorage.INDEX_RECORD.size // 2)
+        self.assert_recovered(self.open_storage(), BLOCK_COUNT)
+
+    def test_missing_index_is_rebuilt(self):
+        os.remove(self.index_path())
+        self.assert_recovered(self.open_storage(), BLOCK_COUNT)
+
+    def test_rebuild_stops_at_a_corrupt_record(self):
+        os.remove(self.index_path())
+        with open(self.segment_path(1), mode='r+b') as datastore:
+            lines = datastore.readlines()
+            datastore.seek(len(lines[0]))
+            datastore.write(b'#' * (len(lines[1]) - 1))
+        storage = self.open_storage()
+        self.assert_recovered(storage, SEGMENT_SIZE + 1)
+        self.assertFalse(os.path.exists(self.segment_path(2)))
+
+    def test_segment_gap_drops_later_segments(self):
+        os.remove(self.segment_path(1))
+        storage = self.open_storage()
+        self.assert_recovered(storage, SEGMENT_SIZE)
+        self.assertFalse(os.path.exists(self.segment_path(2)))
+
+    def test_truncate_inside_a_segment(self):
+        storage = self.open_storage()
+        storage.truncate(SEGMENT_SIZE + 1)
+        self.assert_recovered(storage, SEGMENT_SIZE + 1)
+        self.assertFalse(os.path.exists(self.segment_path(2)))
+        storage.append_blocks(make_block(index) for index in range(SEGMENT_SIZE + 1, BLOCK_COUNT))
+        self.assert_recovered(storage, BLOCK_COUNT)
+
+    def test_truncate_at_a_segment_boundary(self):
+        storage = self.open_storage()
+        storage.truncate(SEGMENT_SIZE)
+        self.assert_recovered(storage, SEGMENT_SIZE)
+        self.assertFalse(os.path.exists(self.segment_path(1)))
+
+    def test_replace_blocks_rewrites_the_suffix(self):
+        storage = self.open_storage()
+        replacement = [dict(make_block(index), proof=-index) for index in range(2, 5)]
+        storage.replace_blocks(2, replacement)
+        self.assertEqual(storage.height, 5)
+        self.assertEqual([storage.read_block(index) for index in range(5)],
+                         [make_block(0), make_block(1)] + replacement)
+        self.assertEqual(self.open_storage().read_block(4), replacement[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""Acknowledged transactions survive a SIGKILL of the node in every mempool durability mode."""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import requests
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from utilities.mempool_journal import MempoolJournal  # noqa: E402
+
+LOAD_SECONDS = 2
+LOAD_WORKERS = 8
+STARTUP_SECONDS = 30
+PERIODIC_SETTLE_SECONDS = 0.5
+
+
+class NodeProcess:
+    def __init__(self, directory, mode):
+        self.directory = directory
+        self.mode = mode
+        self.port = self.free_port()
+        self.url = f'http://localhost:{self.port}'
+        self.process = None
+
+    @staticmethod
+    def free_port():
+        with socket.socket() as probe:
+            probe.bind(('localhost', 0))
+            return probe.getsockname()[1]
+
+    def start(self):
+        with open(os.path.join(self.directory, 'node.log'), 'a') as log:
+            self.process = subprocess.Popen(
+                [sys.executable, os.path.join(REPOSITORY, 'node.py'), '-p', str(self.port),
+                 '--mempool-durability', self.mode],
+                cwd=self.directory, stdout=log, stderr=subprocess.STDOUT
+            )
+        deadline = time.monotonic() + STARTUP_SECONDS
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'node exited with {self.process.returncode}')
+            try:
+                requests.get(self.url + '/chain/tip', timeout=0.5)
+                return
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        self.kill()
+        raise RuntimeError('node did not start')
+
+    def kill(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.send_signal(signal.SIGKILL)
+        if self.process is not None:
+            self.process.wait()
+
+
+class MempoolDurabilityTest(unittest.TestCase):
+    def run_load(self, node, stop):
+        acknowledged = []
+        lock = threading.Lock()
+
+        def send(worker):
+            session = requests.Session()
+            position = 0
+            while not stop.is_set():
+                recipient = f'recipient-{worker}-{position}'
+                try:
+                    response = session.post(node.url + '/transaction', json={'recipient': recipient, 'amount': 0.01},
+                                            timeout=5)
+                except requests.RequestException:
+                    return
+                if response.status_code == 201:
+                    with lock:
+                        acknowledged.append(recipient)
+                position += 1
+
+        workers = [threading.Thread(target=send, args=(worker,)) for worker in range(LOAD_WORKERS)]
+        for worker in workers:
+            worker.start()
+        return acknowledged, workers
+
+    def crash_and_recover(self, mode):
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'data'))
+            node = NodeProcess(directory, mode)
+            node.start()
+            try:
+                self.assertEqual(requests.post(node.url + '/wallet').status_code, 201)
+                self.assertEqual(requests.post(node.url + '/mine').status_code, 201)
+
+                stop = threading.Event()
+                acknowledged, workers = self.run_load(node, stop)
+                time.sleep(LOAD_SECONDS)
+                if mode == MempoolJournal.PERIODIC:
+                    # periodic mode acknowledges before writing, so only changes older than the window are durable
+                    stop.set()
+                    for worker in workers:
+                        worker.join()
+                    time.sleep(PERIODIC_SETTLE_SECONDS)
+                node.kill()
+                stop.set()
+                for worker in workers:
+                    worker.join()
+                self.assertTrue(acknowledged)
+
+                node.start()
+                transactions = requests.get(node.url + '/transactions').json()['transactions']
+                recovered = {transaction['recipient'] for transaction in transactions}
+                missing = [recipient for recipient in acknowledged if recipient not in recovered]
+                self.assertEqual(len(missing), 0,
+                                 f'{len(missing)} of {len(acknowledged)} acknowledged transactions lost')
+            finally:
+                node.kill()
+
+    def test_acknowledged_transactions_survive_sigkill(self):
+        for mode in MempoolJournal.MODES:
+            with self.subTest(mode=mode):
+                self.crash_and_recover(mode)
+
+
+if __name__ == '__main__':
+    unittest.main()
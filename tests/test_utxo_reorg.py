@@ -0,0 +1,140 @@
+"""The UTXO set follows reorgs, restores itself after a rejected suffix and replays blocks after a snapshot."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from block import Block  # noqa: E402
+from blockchain import Blockchain  # noqa: E402
+from configuration import Configuration  # noqa: E402
+from transaction import Transaction  # noqa: E402
+from utilities.hash_util import HashUtil  # noqa: E402
+from utilities.utxo import UtxoSet  # noqa: E402
+from wallet import Wallet  # noqa: E402
+
+SETTINGS = {
+    'LEDGER_MODE': 'utxo',
+    'MINING_DIFFICULTY': 1,
+    'UTXO_UNDO_DEPTH': 4,
+    'UTXO_SNAPSHOT_INTERVAL': 3,
+    'MEMPOOL_DURABILITY': 'sync'
+}
+FORK_INDEX = 3
+
+
+class UtxoReorgTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.wallet = Wallet()
+        cls.wallet.create_keys()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = dict(SETTINGS, BLOCKCHAIN_FILE=os.path.join(directory.name, 'blockchain.dat'))
+        for name, value in settings.items():
+            self.addCleanup(setattr, Configuration, name, getattr(Configuration, name))
+            setattr(Configuration, name, value)
+
+    def open_blockchain(self, network_id):
+        blockchain = Blockchain(self.wallet.public_key, network_id=network_id)
+        self.addCleanup(blockchain.close)
+        return blockchain
+
+    def grow(self, blockchain, blocks, recipient):
+        for _ in range(blocks):
+            inputs = blockchain.select_inputs(self.wallet.public_key, 1)
+            if inputs is not None:
+                signature = self.wallet.sign_transaction(self.wallet.public_key, recipient, 1, 0, inputs)
+                self.assertTrue(
+                    blockchain.add_transaction(recipient, self.wallet.public_key, 1, signature, inputs=inputs)
+                )
+            self.assertIsNotNone(blockchain.mine_block())
+
+    def fork(self, blockchain, network_id, blocks, recipient):
+        fork = self.open_blockchain(network_id)
+        self.assertTrue(fork.replace_chain_suffix(1, [blockchain.chain_view[index] for index in range(1, FORK_INDEX)]))
+        fork.save_chain()
+        self.grow(fork, blocks, recipient)
+        return [fork.chain_view[index] for index in range(FORK_INDEX, len(fork.chain_view))]
+
+    def assert_matches_chain(self, blockchain):
+        expected = UtxoSet()
+        expected.rebuild(list(blockchain.chain_view))
+        self.assertEqual(sorted(blockchain.utxos.get_savable_version()['outputs']),
+                         sorted(expected.get_savable_version()['outputs']))
+
+    def test_reorg_inside_the_undo_depth(self):
+        blockchain = self.open_blockchain('local')
+        self.grow(blockchain, 4, 'alice')
+        suffix = self.fork(blockchain, 'peer', 5, 'bob')
+        self.assertLessEqual(len(blockchain.chain_view) - FORK_INDEX, Configuration.UTXO_UNDO_DEPTH)
+        with mock.patch.object(UtxoSet, 'rebuild', side_effect=AssertionError('rebuilt')):
+            self.assertTrue(blockchain.replace_chain_suffix(FORK_INDEX, suffix))
+        self.assertEqual(blockchain.chain_view.tip.hash, suffix[-1].hash)
+        self.assert_matches_chain(blockchain)
+
+    def test_reorg_deeper_than_the_undo_depth_rebuilds(self):
+        blockchain = self.open_blockchain('local')
+        self.grow(blockchain, 7, 'alice')
+        suffix = self.fork(blockchain, 'peer', 8, 'bob')
+        self.assertGreater(len(blockchain.chain_view) - FORK_INDEX, Configuration.UTXO_UNDO_DEPTH)
+        with mock.patch.object(UtxoSet, 'rebuild', autospec=True, side_effect=UtxoSet.rebuild) as rebuild:
+            self.assertTrue(blockchain.replace_chain_suffix(FORK_INDEX, suffix))
+        rebuild.assert_called_once()
+        self.assert_matches_chain(blockchain)
+        self.grow(blockchain, 2, 'carol')
+        self.assert_matches_chain(blockchain)
+
+    def test_invalid_suffix_restores_the_local_set(self):
+        for local_blocks in (3, 7):
+            with self.subTest(local_blocks=local_blocks):
+                blockchain = self.open_blockchain(f'local-{local_blocks}')
+                self.grow(blockchain, local_blocks, 'alice')
+                suffix = self.fork(blockchain, f'peer-{local_blocks}', 3, 'bob')
+                last_block = suffix[-1]
+                bogus_spend = Transaction(self.wallet.public_key, 'mallory', 1, 'signature', inputs=('missing:0',))
+                reward = Transaction(Configuration.MINING_SENDER, 'mallory', Configuration.MINING_REWARD, '')
+                suffix.append(Block(last_block.index + 1, HashUtil.hash_block(last_block), [bogus_spend, reward], 0,
+                                    version=last_block.version))
+                tip = blockchain.chain_view.tip.hash
+                outputs = sorted(blockchain.utxos.get_savable_version()['outputs'])
+                self.assertFalse(blockchain.replace_chain_suffix(FORK_INDEX, suffix))
+                self.assertEqual(blockchain.chain_view.tip.hash, tip)
+                self.assertEqual(sorted(blockchain.utxos.get_savable_version()['outputs']), outputs)
+                self.assert_matches_chain(blockchain)
+                self.grow(blockchain, 1, 'carol')
+                self.assert_matches_chain(blockchain)
+
+    def test_reload_replays_blocks_after_the_snapshot(self):
+        blockchain = Blockchain(self.wallet.public_key, network_id='local')
+        self.grow(blockchain, 4, 'alice')
+        snapshot = blockchain.storage.load_utxos()
+        self.grow(blockchain, 2, 'bob')
+        self.assertLess(snapshot['height'], len(blockchain.chain_view))
+        blockchain.close()
+        blockchain.storage.save_utxos(snapshot)
+        with mock.patch.object(UtxoSet, 'rebuild', side_effect=AssertionError('rebuilt')):
+            reloaded = self.open_blockchain('local')
+        self.assertEqual(len(reloaded.chain_view), len(blockchain.chain_view))
+        self.assert_matches_chain(reloaded)
+        self.grow(reloaded, 1, 'carol')
+        self.assert_matches_chain(reloaded)
+
+    def test_reload_rebuilds_from_a_stale_snapshot(self):
+        blockchain = Blockchain(self.wallet.public_key, network_id='local')
+        self.grow(blockchain, 4, 'alice')
+        snapshot = dict(blockchain.storage.load_utxos(), tip_hash='stale')
+        blockchain.close()
+        blockchain.storage.save_utxos(snapshot)
+        reloaded = self.open_blockchain('local')
+        self.assert_matches_chain(reloaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
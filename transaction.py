@@ -1,23 +1,109 @@
 from collections import OrderedDict
 
+from utilities.encoding import BinaryEncoding, BinaryReader
+from utilities.hash_util import HashUtil
+
 
 class Transaction:
-    def __init__(self, sender, recipient, amount, signature):
+    __slots__ = ('sender', 'recipient', 'amount', 'signature', 'fee', 'inputs', '_ordered_dict',
+                 '_canonical_bytes', '_binary', '_digest')
+    FEE_MARKER = 2
+    INPUTS_MARKER = 3
+
+    def __init__(self, sender, recipient, amount, signature, fee=0, inputs=()):
         self.sender = sender
         self.recipient = recipient
         self.amount = amount
         self.signature = signature
+        self.fee = fee
+        self.inputs = tuple(inputs)
+        self._ordered_dict = None
+        self._canonical_bytes = None
+        self._binary = None
+        self._digest = None
+
+    @classmethod
+    def from_savable_version(cls, transaction_data):
+        return cls(
+            transaction_data['sender'],
+            transaction_data['recipient'],
+            transaction_data['amount'],
+            transaction_data['signature'],
+            transaction_data.get('fee', 0),
+            transaction_data.get('inputs', ())
+        )
+
+    @classmethod
+    def from_bytes(cls, data):
+        reader = BinaryReader(data)
+        transaction = cls.read_from(reader)
+        reader.finish()
+        return transaction
+
+    @classmethod
+    def read_from(cls, reader):
+        fee = 0
+        inputs = ()
+        if reader.peek_uint8() == cls.FEE_MARKER:
+            reader.read_uint8()
+            fee = reader.read_number()
+        if reader.peek_uint8() == cls.INPUTS_MARKER:
+            reader.read_uint8()
+            inputs = [reader.read_text() for _ in range(reader.read_uint32())]
+        return cls(reader.read_text(), reader.read_text(), reader.read_number(), reader.read_text(), fee, inputs)
 
     def __repr__(self):
-        return str(self.__dict__)
+        return str(dict(self.to_ordered_dict()))
 
     def get_savable_version(self):
-        return self.__dict__.copy()
+        return self.to_ordered_dict()
 
     def to_ordered_dict(self):
-        return OrderedDict([
-            ('sender', self.sender),
-            ('recipient', self.recipient),
-            ('amount', self.amount),
-            ('signature', self.signature)
-        ])
+        if self._ordered_dict is None:
+            self._ordered_dict = OrderedDict([
+                ('sender', self.sender),
+                ('recipient', self.recipient),
+                ('amount', self.amount),
+                ('signature', self.signature)
+            ])
+            if self.fee:
+                self._ordered_dict['fee'] = self.fee
+            if self.inputs:
+                self._ordered_dict['inputs'] = list(self.inputs)
+        return self._ordered_dict
+
+    @property
+    def cost(self):
+        return self.amount + self.fee
+
+    @property
+    def size(self):
+        return len(self.to_bytes())
+
+    @property
+    def canonical_bytes(self):
+        if self._canonical_bytes is None:
+            self._canonical_bytes = str(self.to_ordered_dict()).encode()
+        return self._canonical_bytes
+
+    def to_bytes(self):
+        if self._binary is None:
+            self._binary = BinaryEncoding.pack_text(self.sender) \
+                + BinaryEncoding.pack_text(self.recipient) \
+                + BinaryEncoding.pack_number(self.amount) \
+                + BinaryEncoding.pack_text(self.signature)
+            if self.inputs:
+                self._binary = BinaryEncoding.pack_uint8(self.INPUTS_MARKER) \
+                    + BinaryEncoding.UINT32.pack(len(self.inputs)) \
+                    + b''.join(BinaryEncoding.pack_text(outpoint) for outpoint in self.inputs) \
+                    + self._binary
+            if self.fee:
+                self._binary = BinaryEncoding.pack_uint8(self.FEE_MARKER) + BinaryEncoding.pack_number(self.fee) \
+                    + self._binary
+        return self._binary
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = HashUtil.hash_string_256(self.to_bytes())
+        return self._digest
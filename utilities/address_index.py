@@ -0,0 +1,192 @@
+"""Persistent index from addresses to the transactions that touch them."""
+
+import threading
+
+from configuration import Configuration
+from utilities.cache import LRUCache
+
+
+class AddressIndex:
+    def __init__(self, storage, cache_size=None):
+        self.storage = storage
+        self.generation = 0
+        self.__histories = LRUCache(Configuration.ADDRESS_CACHE_SIZE if cache_size is None else cache_size)
+        self.__heads = {}
+        self.__saved_height = 0
+        self.__saved_tip = None
+        self.__snapshot_height = 0
+        self.__unsaved = []
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return self.__saved_height + len(self.__unsaved)
+
+    def load(self, chain):
+        heads, height, size, tip = {}, 0, 0, None
+        snapshot = self.storage.load_address_heads()
+        if self._snapshot_matches(snapshot, chain):
+            heads, height, size = snapshot['heads'], snapshot['height'], snapshot['size']
+            tip = (snapshot['tip_offset'], snapshot['tip_hash'])
+        self.__snapshot_height = height
+        pending = []
+        for start, end, record in self.storage.iter_address_log(size):
+            if 'address' in record:
+                if record['index'] != height or record['previous'] != heads.get(record['address']):
+                    break
+                pending.append((record['address'], start))
+                continue
+            if not self._marker_matches(record, chain, height):
+                break
+            heads.update(pending)
+            pending = []
+            height, size, tip = height + 1, end, (start, record['hash'])
+        if self.storage.truncate_address_log(size):
+            print('Address index is ahead of the chain, dropping stale records!')
+        with self.__lock:
+            self.generation += 1
+            self.__histories.clear()
+            self.__heads = heads
+            self.__saved_height = height
+            self.__saved_tip = tip
+            self.__unsaved = []
+        for block in chain[height:]:
+            self.apply_block(block)
+        self.flush()
+
+    def apply_block(self, block):
+        positions = {}
+        for position, tx in enumerate(block.transactions):
+            for address in dict.fromkeys((tx.sender, tx.recipient)):
+                if address != Configuration.MINING_SENDER:
+                    positions.setdefault(address, []).append(position)
+        with self.__lock:
+            self.generation += 1
+            self.__unsaved.append({'index': block.index, 'hash': block.hash, 'positions': positions})
+            for address, address_positions in positions.items():
+                history = self.__histories.peek(address)
+                if history is not None:
+                    history.extend((block.index, position) for position in address_positions)
+
+    def revert_to(self, height):
+        if height >= len(self):
+            return
+        with self.__lock:
+            self.generation += 1
+            self.__histories.clear()
+            if height >= self.__saved_height:
+                del self.__unsaved[height - self.__saved_height:]
+                return
+            self.__unsaved = []
+            found = self.storage.find_address_log_record(
+                lambda record: 'address' not in record and record['index'] == height - 1
+            ) if height > 0 else None
+            if height > 0 and found is None:
+                raise ValueError(f'address index has no record for block {height - 1}')
+            size, tip = (found[1], (found[0], found[2]['hash'])) if found is not None else (0, None)
+            reverted = [record for _, _, record in self.storage.iter_address_log(size) if 'address' in record]
+            for record in reversed(reverted):
+                if record['previous'] is None:
+                    self.__heads.pop(record['address'], None)
+                else:
+                    self.__heads[record['address']] = record['previous']
+            self.storage.truncate_address_log(size)
+            self.__saved_height = height
+            self.__saved_tip = tip
+            if height < self.__snapshot_height:
+                self._save_snapshot(size)
+
+    def flush(self):
+        with self.__lock:
+            if not self.__unsaved:
+                return
+            offset = self.storage.address_log_size()
+            heads = dict(self.__heads)
+            lines = []
+            tip = None
+            for block_record in self.__unsaved:
+                for address, positions in block_record['positions'].items():
+                    line = self.storage.encode_log_record({
+                        'address': address,
+                        'index': block_record['index'],
+                        'positions': positions,
+                        'previous': heads.get(address)
+                    })
+                    heads[address] = offset
+                    lines.append(line)
+                    offset += len(line)
+                line = self.storage.encode_log_record({'index': block_record['index'], 'hash': block_record['hash']})
+                tip = (offset, block_record['hash'])
+                lines.append(line)
+                offset += len(line)
+            self.storage.append_address_log(lines)
+            self.__heads = heads
+            self.__saved_height += len(self.__unsaved)
+            self.__saved_tip = tip
+            self.__unsaved = []
+            if self.__saved_height - self.__snapshot_height >= Configuration.ADDRESS_SNAPSHOT_INTERVAL:
+                self._save_snapshot(offset)
+
+    def save_snapshot(self):
+        self.flush()
+        with self.__lock:
+            if self.__saved_height != self.__snapshot_height:
+                self._save_snapshot(self.storage.address_log_size())
+
+    def count(self, address):
+        return len(self._history(address))
+
+    def get_history(self, address, start, stop):
+        return self._history(address)[start:stop]
+
+    def _history(self, address):
+        while True:
+            with self.__lock:
+                history = self.__histories.get(address)
+                if history is not None:
+                    return history
+                generation = self.generation
+                head = self.__heads.get(address)
+                unsaved = [
+                    (block_record['index'], position) for block_record in self.__unsaved
+                    for position in block_record['positions'].get(address, ())
+                ]
+            try:
+                records = self.storage.read_address_log_chain(head, 'previous') if head is not None else []
+                if any(record.get('address') != address for record in records):
+                    raise ValueError(f'address index chain for {address} is broken')
+            except (IOError, ValueError):
+                if generation == self.generation:
+                    raise
+                continue
+            history = [
+                (record['index'], position) for record in reversed(records) for position in record['positions']
+            ] + unsaved
+            with self.__lock:
+                if generation != self.generation:
+                    continue
+                self.__histories.put(address, history)
+            return history
+
+    def _save_snapshot(self, size):
+        tip_offset, tip_hash = self.__saved_tip if self.__saved_tip is not None else (None, None)
+        self.storage.save_address_heads({
+            'height': self.__saved_height,
+            'size': size,
+            'tip_offset': tip_offset,
+            'tip_hash': tip_hash,
+            'heads': self.__heads
+        })
+        self.__snapshot_height = self.__saved_height
+
+    def _snapshot_matches(self, snapshot, chain):
+        if snapshot is None or not 0 < snapshot['height'] <= len(chain) \
+                or chain[snapshot['height'] - 1].hash != snapshot['tip_hash']:
+            return False
+        found = next(iter(self.storage.iter_address_log(snapshot['tip_offset'])), None)
+        return found is not None and found[1] == snapshot['size'] \
+            and self._marker_matches(found[2], chain, snapshot['height'] - 1)
+
+    @staticmethod
+    def _marker_matches(record, chain, index):
+        return record.keys() == {'index', 'hash'} and record['index'] == index and index < len(chain) \
+            and record['hash'] == chain[index].hash
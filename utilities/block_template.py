@@ -0,0 +1,48 @@
+"""Selection of open transactions for the next block."""
+
+from configuration import Configuration
+from utilities.verification import Verification
+from wallet import Wallet
+
+
+class BlockTemplate:
+    def __init__(self, max_transactions=None, max_bytes=None):
+        self.max_transactions = Configuration.BLOCK_MAX_TRANSACTIONS if max_transactions is None else max_transactions
+        self.max_bytes = Configuration.BLOCK_MAX_BYTES if max_bytes is None else max_bytes
+
+    @staticmethod
+    def priority(transaction):
+        return transaction.fee / transaction.size
+
+    def select(self, transactions, get_confirmed_balance, get_output=None):
+        transactions = list(transactions)
+        signatures = Wallet.verify_transactions(transactions)
+        invalid = []
+        candidates = []
+        for position, (tx, is_valid) in enumerate(zip(transactions, signatures)):
+            if not is_valid or tx.fee < 0 or (get_output is not None and not Verification.valid_inputs(tx, get_output)):
+                invalid.append(tx)
+            else:
+                candidates.append((position, tx))
+        candidates.sort(key=lambda candidate: (-self.priority(candidate[1]), candidate[0]))
+        selected = []
+        selected_bytes = 0
+        spent = {}
+        spent_outputs = set()
+        for _, tx in candidates:
+            if len(selected) >= self.max_transactions:
+                break
+            if selected_bytes + tx.size > self.max_bytes:
+                continue
+            if get_output is not None:
+                if not spent_outputs.isdisjoint(tx.inputs):
+                    continue
+                spent_outputs.update(tx.inputs)
+            else:
+                sender_spent = spent.get(tx.sender, 0) + tx.cost
+                if sender_spent > get_confirmed_balance(tx.sender):
+                    continue
+                spent[tx.sender] = sender_spent
+            selected.append(tx)
+            selected_bytes += tx.size
+        return selected, invalid
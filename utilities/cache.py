@@ -0,0 +1,40 @@
+"""Bounded caches for frequently repeated work."""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.__entries = OrderedDict()
+        self.__lock = Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key, default=None):
+        with self.__lock:
+            try:
+                value = self.__entries[key]
+            except KeyError:
+                return default
+            self.__entries.move_to_end(key)
+            return value
+
+    def peek(self, key, default=None):
+        with self.__lock:
+            return self.__entries.get(key, default)
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
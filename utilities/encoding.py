@@ -0,0 +1,112 @@
+"""Compact deterministic binary encoding for blockchain elements."""
+
+import struct
+
+
+class BinaryEncoding:
+    CONTENT_TYPE = 'application/octet-stream'
+    TEXT = 0
+    HEX = 1
+    INTEGER = 0
+    FLOAT = 1
+    UINT8 = struct.Struct('>B')
+    UINT32 = struct.Struct('>I')
+    UINT64 = struct.Struct('>Q')
+    FLOAT64 = struct.Struct('>d')
+
+    @classmethod
+    def pack_uint8(cls, value):
+        return cls.UINT8.pack(value)
+
+    @classmethod
+    def pack_uint64(cls, value):
+        return cls.UINT64.pack(value)
+
+    @classmethod
+    def pack_bytes(cls, data):
+        return cls.UINT32.pack(len(data)) + data
+
+    @classmethod
+    def pack_text(cls, value):
+        try:
+            data = bytes.fromhex(value)
+        except ValueError:
+            data = None
+        if data and data.hex() == value:
+            return cls.pack_uint8(cls.HEX) + cls.pack_bytes(data)
+        return cls.pack_uint8(cls.TEXT) + cls.pack_bytes(value.encode())
+
+    @classmethod
+    def pack_number(cls, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypeError(f'cannot encode {type(value).__name__} as a number')
+        if isinstance(value, float):
+            return cls.pack_uint8(cls.FLOAT) + cls.FLOAT64.pack(value)
+        length = (value + (value < 0)).bit_length() // 8 + 1
+        return cls.pack_uint8(cls.INTEGER) + cls.pack_bytes(value.to_bytes(length, 'big', signed=True))
+
+    @classmethod
+    def pack_list(cls, items):
+        items = list(items)
+        return cls.UINT32.pack(len(items)) + b''.join(cls.pack_bytes(item) for item in items)
+
+    @classmethod
+    def unpack_list(cls, data):
+        reader = BinaryReader(data)
+        items = [reader.read_bytes() for _ in range(reader.read_uint32())]
+        reader.finish()
+        return items
+
+
+class BinaryReader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def read(self, size):
+        if self.offset + size > len(self.data):
+            raise ValueError('binary data is truncated')
+        chunk = self.data[self.offset:self.offset + size].tobytes()
+        self.offset += size
+        return chunk
+
+    def peek_uint8(self):
+        if self.offset >= len(self.data):
+            raise ValueError('binary data is truncated')
+        return self.data[self.offset]
+
+    def read_struct(self, layout):
+        return layout.unpack(self.read(layout.size))[0]
+
+    def read_uint8(self):
+        return self.read_struct(BinaryEncoding.UINT8)
+
+    def read_uint32(self):
+        return self.read_struct(BinaryEncoding.UINT32)
+
+    def read_uint64(self):
+        return self.read_struct(BinaryEncoding.UINT64)
+
+    def read_bytes(self):
+        return self.read(self.read_uint32())
+
+    def read_text(self):
+        kind = self.read_uint8()
+        data = self.read_bytes()
+        if kind == BinaryEncoding.HEX and data:
+            return data.hex()
+        if kind == BinaryEncoding.TEXT:
+            return data.decode()
+        raise ValueError('unknown text encoding')
+
+    def read_number(self):
+        kind = self.read_uint8()
+        if kind == BinaryEncoding.FLOAT:
+            return self.read_struct(BinaryEncoding.FLOAT64)
+        if kind == BinaryEncoding.INTEGER:
+            return int.from_bytes(self.read_bytes(), 'big', signed=True)
+        raise ValueError('unknown number encoding')
+
+    def finish(self):
+        if self.offset != len(self.data):
+            raise ValueError('unexpected trailing binary data')
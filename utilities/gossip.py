@@ -0,0 +1,111 @@
+"""Background fan-out of transactions and blocks to peer nodes."""
+
+import queue
+import threading
+import time
+from time import perf_counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from configuration import Configuration
+from utilities.encoding import BinaryEncoding
+from utilities.metrics import REGISTRY
+
+_gossip_seconds = REGISTRY.histogram('gossip_request_seconds', 'Round-trip time of gossip posts.', ['peer', 'path'])
+_gossip_failures = REGISTRY.counter('gossip_failures_total', 'Gossip posts that exhausted their retries.',
+                                    ['peer', 'path'])
+_gossip_dropped = REGISTRY.counter('gossip_dropped_total', 'Gossip messages dropped on a full queue.', ['peer'])
+
+
+class PeerWorker(threading.Thread):
+    def __init__(self, node, timeout, queue_size, retries, backoff):
+        super().__init__(name=f'gossip-{node}', daemon=True)
+        self.node = node
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.messages = queue.Queue(maxsize=queue_size)
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+    def submit(self, path, payload, on_response):
+        try:
+            self.messages.put_nowait((path, payload, on_response))
+            return True
+        except queue.Full:
+            print(f'Gossip queue for {self.node} is full, dropping message!')
+            _gossip_dropped.inc(peer=self.node)
+            return False
+
+    def stop(self):
+        try:
+            self.messages.put_nowait(None)
+        except queue.Full:
+            self.messages.get_nowait()
+            self.messages.put_nowait(None)
+
+    def run(self):
+        while True:
+            message = self.messages.get()
+            if message is None:
+                break
+            path, payload, on_response = message
+            response = self.post(path, payload)
+            if response is not None and on_response is not None:
+                try:
+                    on_response(self.node, response)
+                except Exception as error:
+                    print(f'Handling gossip response from {self.node} failed: {error}')
+        self.session.close()
+
+    def post(self, path, payload):
+        url = f'http://{self.node}{path}'
+        for attempt in range(self.retries + 1):
+            started = perf_counter()
+            try:
+                if isinstance(payload, bytes):
+                    response = self.session.post(url, data=payload, timeout=self.timeout,
+                                                 headers={'Content-Type': BinaryEncoding.CONTENT_TYPE})
+                else:
+                    response = self.session.post(url, json=payload, timeout=self.timeout)
+                _gossip_seconds.observe(perf_counter() - started, peer=self.node, path=path)
+                return response
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+            except requests.exceptions.RequestException as error:
+                print(f'Gossip to {self.node} failed, giving up on {path}: {error}')
+                break
+        else:
+            print(f'Peer {self.node} is unreachable, giving up on {path}!')
+        _gossip_failures.inc(peer=self.node, path=path)
+        return None
+
+
+class GossipDispatcher:
+    def __init__(self, timeout=None, queue_size=None, retries=None, backoff=None):
+        self.timeout = Configuration.GOSSIP_TIMEOUT if timeout is None else timeout
+        self.queue_size = Configuration.GOSSIP_QUEUE_SIZE if queue_size is None else queue_size
+        self.retries = Configuration.GOSSIP_RETRIES if retries is None else retries
+        self.backoff = Configuration.GOSSIP_BACKOFF if backoff is None else backoff
+        self.__workers = {}
+        self.__lock = threading.Lock()
+
+    def broadcast(self, peer_nodes, path, payload, on_response=None):
+        with self.__lock:
+            for node in set(self.__workers) - set(peer_nodes):
+                self.__workers.pop(node).stop()
+            for node in peer_nodes:
+                worker = self.__workers.get(node)
+                if worker is None or not worker.is_alive():
+                    worker = PeerWorker(node, self.timeout, self.queue_size, self.retries, self.backoff)
+                    worker.start()
+                    self.__workers[node] = worker
+                worker.submit(path, payload, on_response)
+
+    def stop(self):
+        with self.__lock:
+            for worker in self.__workers.values():
+                worker.stop()
+            self.__workers = {}
@@ -0,0 +1,44 @@
+"""Balance index for blockchain participants."""
+
+from collections import defaultdict
+
+
+class Ledger:
+    def __init__(self):
+        self.confirmed_sent = defaultdict(int)
+        self.confirmed_received = defaultdict(int)
+
+    @classmethod
+    def from_savable_version(cls, ledger_data):
+        ledger = cls()
+        ledger.confirmed_sent.update(ledger_data['sent'])
+        ledger.confirmed_received.update(ledger_data['received'])
+        return ledger
+
+    def get_savable_version(self):
+        return {'sent': dict(self.confirmed_sent), 'received': dict(self.confirmed_received)}
+
+    def rebuild(self, chain):
+        self.confirmed_sent.clear()
+        self.confirmed_received.clear()
+        for block in chain:
+            self.apply_block(block)
+
+    def apply_block(self, block):
+        for tx in block.transactions:
+            self.confirmed_sent[tx.sender] += tx.cost
+            self.confirmed_received[tx.recipient] += tx.amount
+
+    def revert_block(self, block):
+        for tx in block.transactions:
+            self.confirmed_sent[tx.sender] -= tx.cost
+            self.confirmed_received[tx.recipient] -= tx.amount
+
+    def get_sent(self, participant):
+        return self.confirmed_sent.get(participant, 0)
+
+    def get_received(self, participant):
+        return self.confirmed_received.get(participant, 0)
+
+    def get_balance(self, participant):
+        return self.get_received(participant) - self.get_sent(participant)
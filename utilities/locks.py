@@ -0,0 +1,98 @@
+"""Reader-writer locking for shared blockchain state."""
+
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+
+class ReadWriteLock:
+    def __init__(self):
+        self.__condition = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__waiting_readers = 0
+        self.__waiting_writers = 0
+        self.__readers_turn = False
+        self.__writer = None
+        self.__writer_depth = 0
+        self.__local = threading.local()
+
+    def acquire_read(self):
+        with self.__condition:
+            if self.__writer == threading.get_ident():
+                self.__writer_depth += 1
+                return
+            read_depth = getattr(self.__local, 'read_depth', 0)
+            if read_depth == 0:
+                self.__waiting_readers += 1
+                while self.__writer is not None or (self.__waiting_writers and not self.__readers_turn):
+                    self.__condition.wait()
+                self.__waiting_readers -= 1
+                if self.__waiting_readers == 0:
+                    self.__readers_turn = False
+                self.__readers += 1
+            self.__local.read_depth = read_depth + 1
+
+    def release_read(self):
+        with self.__condition:
+            if self.__writer == threading.get_ident():
+                self.__writer_depth -= 1
+                return
+            self.__local.read_depth -= 1
+            if self.__local.read_depth == 0:
+                self.__readers -= 1
+                if self.__readers == 0:
+                    self.__condition.notify_all()
+
+    def acquire_write(self):
+        with self.__condition:
+            if self.__writer == threading.get_ident():
+                self.__writer_depth += 1
+                return
+            if getattr(self.__local, 'read_depth', 0):
+                raise RuntimeError('A read lock cannot be upgraded to a write lock')
+            self.__waiting_writers += 1
+            while self.__writer is not None or self.__readers or self.__readers_turn:
+                self.__condition.wait()
+            self.__waiting_writers -= 1
+            self.__writer = threading.get_ident()
+            self.__writer_depth = 1
+
+    def release_write(self):
+        with self.__condition:
+            self.__writer_depth -= 1
+            if self.__writer_depth == 0:
+                self.__writer = None
+                self.__readers_turn = self.__waiting_readers > 0
+                self.__condition.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+def read_locked(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.reading():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def write_locked(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.writing():
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,83 @@
+"""Indexed pool of open transactions."""
+
+from collections import OrderedDict
+from itertools import islice
+
+from configuration import Configuration
+
+
+class Mempool:
+    EVICT_OLDEST = 'oldest'
+    REJECT_NEW = 'reject'
+
+    def __init__(self, transactions=None, max_size=None, eviction_policy=None):
+        self.max_size = Configuration.MEMPOOL_MAX_SIZE if max_size is None else max_size
+        self.eviction_policy = Configuration.MEMPOOL_EVICTION if eviction_policy is None else eviction_policy
+        self.__transactions = OrderedDict()
+        self.__by_sender = {}
+        self.__pending_amounts = {}
+        self.__spent_outputs = {}
+        for transaction in transactions or []:
+            self.add(transaction)
+
+    def __len__(self):
+        return len(self.__transactions)
+
+    def __iter__(self):
+        return iter(self.__transactions.values())
+
+    def __contains__(self, transaction):
+        return transaction.digest in self.__transactions
+
+    def add(self, transaction):
+        if transaction.digest in self.__transactions:
+            return False
+        if any(outpoint in self.__spent_outputs for outpoint in transaction.inputs):
+            return False
+        if len(self.__transactions) >= self.max_size:
+            if self.eviction_policy != self.EVICT_OLDEST or not self.__transactions:
+                return False
+            self.remove(next(iter(self.__transactions.values())))
+        self.__transactions[transaction.digest] = transaction
+        self.__by_sender.setdefault(transaction.sender, OrderedDict())[transaction.digest] = transaction
+        self.__pending_amounts[transaction.sender] = \
+            self.__pending_amounts.get(transaction.sender, 0) + transaction.cost
+        for outpoint in transaction.inputs:
+            self.__spent_outputs[outpoint] = transaction.digest
+        return True
+
+    def remove(self, transaction):
+        return self.remove_digest(transaction.digest)
+
+    def remove_digest(self, digest):
+        stored_transaction = self.__transactions.pop(digest, None)
+        if stored_transaction is None:
+            return False
+        for outpoint in stored_transaction.inputs:
+            del self.__spent_outputs[outpoint]
+        sender_transactions = self.__by_sender[stored_transaction.sender]
+        del sender_transactions[stored_transaction.digest]
+        if sender_transactions:
+            self.__pending_amounts[stored_transaction.sender] -= stored_transaction.cost
+        else:
+            del self.__by_sender[stored_transaction.sender]
+            del self.__pending_amounts[stored_transaction.sender]
+        return True
+
+    def remove_many(self, transactions):
+        return sum(1 for transaction in transactions if self.remove(transaction))
+
+    def slice(self, start, stop):
+        return list(islice(self.__transactions.values(), start, stop))
+
+    def digests(self):
+        return list(self.__transactions)
+
+    def get_many(self, digests):
+        return [self.__transactions[digest] for digest in digests if digest in self.__transactions]
+
+    def spends(self, outpoint):
+        return outpoint in self.__spent_outputs
+
+    def pending_amount(self, sender):
+        return self.__pending_amounts.get(sender, 0)
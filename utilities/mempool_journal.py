@@ -0,0 +1,175 @@
+"""Group-commit journal of mempool mutations."""
+
+import threading
+import time
+
+from configuration import Configuration
+from transaction import Transaction
+from utilities.mempool import Mempool
+from utilities.metrics import REGISTRY
+
+_flush_seconds = REGISTRY.histogram('mempool_journal_flush_seconds', 'Time spent writing a mempool journal batch.')
+_batch_records = REGISTRY.histogram(
+    'mempool_journal_batch_records', 'Mempool mutations written per journal batch.',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+
+
+class MempoolJournal:
+    SYNC = 'sync'
+    BATCH = 'batch'
+    PERIODIC = 'periodic'
+    MODES = (SYNC, BATCH, PERIODIC)
+
+    def __init__(self, storage, mode=None, window=None, batch_size=None, max_records=None):
+        self.storage = storage
+        self.mode = Configuration.MEMPOOL_DURABILITY if mode is None else mode
+        if self.mode not in self.MODES:
+            raise ValueError(f'unknown mempool durability mode {self.mode}')
+        self.window = Configuration.MEMPOOL_COMMIT_WINDOW if window is None else window
+        self.batch_size = Configuration.MEMPOOL_COMMIT_BATCH if batch_size is None else batch_size
+        self.max_records = Configuration.MEMPOOL_JOURNAL_MAX_RECORDS if max_records is None else max_records
+        self.sequence = 0
+        self.durable_sequence = 0
+        self.records = 0
+        self.__pending = []
+        self.__pending_writers = 0
+        self.__waiting = 0
+        self.__condition = threading.Condition()
+        self.__writing = threading.Lock()
+        self.__stopping = False
+        self.__thread = None
+
+    @property
+    def needs_checkpoint(self):
+        return self.records >= self.max_records
+
+    def start(self):
+        if self.mode == self.SYNC or self.__thread is not None:
+            return
+        self.__stopping = False
+        self.__thread = threading.Thread(target=self.run, name='mempool-journal', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is not None:
+            with self.__condition:
+                self.__stopping = True
+                self.__condition.notify_all()
+            self.__thread.join()
+            self.__thread = None
+        self.flush()
+
+    def recover(self):
+        sequence, transactions = self.storage.load_mempool()
+        journal = [record for _, record in self.storage.read_mempool_journal()]
+        mempool = Mempool([Transaction.from_savable_version(tx) for tx in transactions])
+        replayed = 0
+        for record in journal:
+            if record['sequence'] > sequence:
+                self.apply(mempool, record)
+                sequence = record['sequence']
+                replayed += 1
+        with self.__condition:
+            self.__pending = []
+            self.sequence = sequence
+            self.durable_sequence = sequence
+            self.records = len(journal)
+        if replayed:
+            print(f'Recovered {replayed} mempool changes from the journal!')
+        return mempool
+
+    @staticmethod
+    def apply(mempool, record):
+        if record['operation'] == 'add':
+            mempool.add(Transaction.from_savable_version(record['transaction']))
+        elif record['operation'] == 'remove':
+            for digest in record['digests']:
+                mempool.remove_digest(digest)
+        else:
+            raise ValueError(f'unknown mempool journal operation {record["operation"]}')
+
+    def record_add(self, transactions):
+        return self._record([
+            {'operation': 'add', 'transaction': transaction.get_savable_version()} for transaction in transactions
+        ])
+
+    def record_remove(self, transactions):
+        return self._record([{'operation': 'remove', 'digests': [tx.digest for tx in transactions]}])
+
+    def _record(self, records):
+        with self.__condition:
+            was_idle = not self.__pending
+            for record in records:
+                self.sequence += 1
+                record['sequence'] = self.sequence
+                self.__pending.append(record)
+            self.records += len(records)
+            self.__pending_writers += 1
+            if was_idle or len(self.__pending) >= self.batch_size:
+                self.__condition.notify_all()
+            sequence = self.sequence
+        if self.mode == self.SYNC:
+            self.flush()
+        return sequence
+
+    def wait(self, sequence):
+        if self.mode != self.BATCH:
+            return
+        with self.__condition:
+            self.__waiting += 1
+            self.__condition.notify_all()
+            try:
+                while self.durable_sequence < sequence and self.__thread is not None:
+                    self.__condition.wait()
+            finally:
+                self.__waiting -= 1
+
+    def flush(self):
+        with self.__writing:
+            with self.__condition:
+                pending, self.__pending = self.__pending, []
+                self.__pending_writers = 0
+            if not pending:
+                return
+            try:
+                with _flush_seconds.time():
+                    self.storage.append_mempool_journal(pending)
+                _batch_records.observe(len(pending))
+            except IOError:
+                print('Saving mempool journal failed!')
+            with self.__condition:
+                self.durable_sequence = max(self.durable_sequence, pending[-1]['sequence'])
+                self.__condition.notify_all()
+
+    def checkpoint(self, transactions):
+        with self.__writing:
+            with self.__condition:
+                sequence = self.sequence
+            self.storage.save_mempool(transactions, sequence)
+            self.storage.truncate_mempool_journal()
+            with self.__condition:
+                self.__pending = [record for record in self.__pending if record['sequence'] > sequence]
+                if not self.__pending:
+                    self.__pending_writers = 0
+                self.records = len(self.__pending)
+                self.durable_sequence = max(self.durable_sequence, sequence)
+                self.__condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.__condition:
+                while not self.__pending and not self.__stopping:
+                    self.__condition.wait()
+                if self.__stopping:
+                    return
+                deadline = time.monotonic() + self.window
+                while not self.__stopping:
+                    if self.mode == self.BATCH and (len(self.__pending) >= self.batch_size
+                                                    or self.__waiting >= self.__pending_writers):
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.__condition.wait(remaining)
+            self.flush()
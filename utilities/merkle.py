@@ -0,0 +1,55 @@
+"""Merkle trees over block transactions."""
+
+import hashlib as hl
+
+
+class MerkleTree:
+    LEAF_PREFIX = b'\x00'
+    NODE_PREFIX = b'\x01'
+    LEFT = 'left'
+    RIGHT = 'right'
+
+    @classmethod
+    def leaf_hash(cls, data):
+        return hl.sha256(cls.LEAF_PREFIX + data).digest()
+
+    @classmethod
+    def node_hash(cls, left, right):
+        return hl.sha256(cls.NODE_PREFIX + left + right).digest()
+
+    @classmethod
+    def root(cls, leaves):
+        level = list(leaves)
+        if not level:
+            return hl.sha256(b'').digest()
+        while len(level) > 1:
+            level = cls._next_level(level)
+        return level[0]
+
+    @classmethod
+    def proof(cls, leaves, index):
+        level = list(leaves)
+        if not 0 <= index < len(level):
+            raise IndexError('leaf index out of range')
+        path = []
+        while len(level) > 1:
+            sibling = index ^ 1
+            if sibling < len(level):
+                path.append((cls.LEFT if sibling < index else cls.RIGHT, level[sibling]))
+            level = cls._next_level(level)
+            index //= 2
+        return path
+
+    @classmethod
+    def verify(cls, leaf, path, root):
+        current = leaf
+        for side, sibling in path:
+            current = cls.node_hash(sibling, current) if side == cls.LEFT else cls.node_hash(current, sibling)
+        return current == root
+
+    @classmethod
+    def _next_level(cls, level):
+        next_level = [cls.node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        return next_level
@@ -0,0 +1,159 @@
+"""Proof-of-work search over nonce ranges."""
+
+import hashlib as hl
+import queue
+import threading
+import time
+
+from configuration import Configuration
+from utilities.processes import ProcessContext
+
+IDLE = 0
+
+
+def search_nonce_range(prefix_hash, target, start, stop):
+    for proof in range(start, stop):
+        guess_hash = prefix_hash.copy()
+        guess_hash.update(str(proof).encode())
+        if guess_hash.hexdigest().startswith(target):
+            return proof
+    return None
+
+
+def _claim_range(active, next_nonce, generation, chunk_size):
+    with next_nonce.get_lock():
+        if active.value != generation:
+            return None
+        start = next_nonce.value
+        next_nonce.value += chunk_size
+        return start
+
+
+def _mining_worker(range_worker, jobs, active, next_nonce, chunk_size, results):
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        generation, prefix, target = job
+        prefix_hash = hl.sha256(prefix)
+        while True:
+            start = _claim_range(active, next_nonce, generation, chunk_size)
+            if start is None:
+                break
+            proof = range_worker(prefix_hash, target, start, start + chunk_size)
+            if proof is not None:
+                with next_nonce.get_lock():
+                    if active.value == generation:
+                        active.value = IDLE
+                results.put((generation, proof))
+                break
+
+
+class Miner:
+    CHUNK_SIZE = 5000
+
+    def __init__(self, workers=1, range_worker=search_nonce_range):
+        self.workers = max(1, workers)
+        self.range_worker = range_worker
+        self.current_nonce = 0
+        self.search_started = None
+        self.__lock = threading.Lock()
+        self.__generation = IDLE
+        self.__processes = None
+        self.__jobs = None
+        self.__active = None
+        self.__next_nonce = None
+        self.__results = None
+
+    @property
+    def hashrate(self):
+        if self.search_started is None:
+            return 0.0
+        elapsed = time.monotonic() - self.search_started
+        return self.current_nonce / elapsed if elapsed > 0 else 0.0
+
+    def find_proof(self, prefix, target, cancel=None):
+        self.current_nonce = 0
+        self.search_started = time.monotonic()
+        if self.workers == 1 or 16 ** len(target) < Configuration.PARALLEL_MINING_THRESHOLD:
+            return self._find_proof_locally(prefix, target, cancel)
+        with self.__lock:
+            return self._find_proof_in_pool(prefix, target, cancel)
+
+    def _find_proof_locally(self, prefix, target, cancel):
+        prefix_hash = hl.sha256(prefix)
+        start = 0
+        while cancel is None or not cancel.is_set():
+            proof = self.range_worker(prefix_hash, target, start, start + self.CHUNK_SIZE)
+            if proof is not None:
+                self.current_nonce = proof
+                return proof
+            start += self.CHUNK_SIZE
+            self.current_nonce = start
+        return None
+
+    def _start_pool(self):
+        context = ProcessContext.get()
+        self.__active = context.Value('Q', IDLE)
+        self.__next_nonce = context.Value('Q', 0)
+        self.__results = context.Queue()
+        self.__jobs = [context.Queue() for _ in range(self.workers)]
+        self.__processes = [
+            context.Process(
+                target=_mining_worker,
+                args=(self.range_worker, jobs, self.__active, self.__next_nonce, self.CHUNK_SIZE, self.__results),
+                name='mining-worker', daemon=True
+            )
+            for jobs in self.__jobs
+        ]
+        for process in self.__processes:
+            process.start()
+
+    def _find_proof_in_pool(self, prefix, target, cancel):
+        if self.__processes is None or not all(process.is_alive() for process in self.__processes):
+            self._stop_pool()
+            self._start_pool()
+        self.__generation += 1
+        generation = self.__generation
+        with self.__next_nonce.get_lock():
+            self.__next_nonce.value = 0
+            self.__active.value = generation
+        for jobs in self.__jobs:
+            jobs.put((generation, prefix, target))
+        proof = None
+        try:
+            while proof is None:
+                if cancel is not None and cancel.is_set():
+                    break
+                self.current_nonce = self.__next_nonce.value
+                try:
+                    result_generation, result = self.__results.get(timeout=0.1)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in self.__processes):
+                        print('All mining workers stopped without a proof!')
+                        break
+                    continue
+                if result_generation == generation:
+                    proof = result
+        finally:
+            with self.__next_nonce.get_lock():
+                if self.__active.value == generation:
+                    self.__active.value = IDLE
+        return proof
+
+    def _stop_pool(self):
+        if self.__processes is None:
+            return
+        for jobs, process in zip(self.__jobs, self.__processes):
+            if process.is_alive():
+                jobs.put(None)
+        for process in self.__processes:
+            process.join()
+        self.__processes = None
+        self.__jobs = None
+
+    def close(self):
+        with self.__lock:
+            if self.__active is not None:
+                self.__active.value = IDLE
+            self._stop_pool()
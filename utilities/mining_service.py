@@ -0,0 +1,87 @@
+"""Continuous background mining on the current chain tip."""
+
+import threading
+import time
+from collections import deque
+
+from configuration import Configuration
+
+
+class MiningService:
+    def __init__(self, blockchain, retry_delay=None, history_size=None):
+        self.blockchain = blockchain
+        self.retry_delay = Configuration.MINING_RETRY_DELAY if retry_delay is None else retry_delay
+        self.block_times = deque(maxlen=Configuration.MINING_STATS_HISTORY if history_size is None else history_size)
+        self.blocks_mined = 0
+        self.restarts = 0
+        self.started_at = None
+        self.__thread = None
+        self.__cancel = None
+        self.__stopping = threading.Event()
+        self.__lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self):
+        with self.__lock:
+            if self.running:
+                return False
+            self.__stopping.clear()
+            self.started_at = time.time()
+            self.__thread = threading.Thread(target=self.run, name='mining-service', daemon=True)
+            self.__thread.start()
+            return True
+
+    def stop(self):
+        with self.__lock:
+            if not self.running:
+                return False
+            self.__stopping.set()
+            if self.__cancel is not None:
+                self.__cancel.set()
+            self.__thread.join()
+            self.__thread = None
+            return True
+
+    def run(self):
+        while True:
+            self.__cancel = threading.Event()
+            if self.__stopping.is_set():
+                break
+            if self.blockchain.hosting_node is None:
+                self.__stopping.wait(self.retry_delay)
+                continue
+            if self.blockchain.resolve_conflicts:
+                self.blockchain.resolve()
+                continue
+            tip_hash = self.blockchain.get_tip()['hash']
+            search_started = time.monotonic()
+            block = self.blockchain.mine_block(self.__cancel)
+            if block is not None:
+                self.blocks_mined += 1
+                self.block_times.append({
+                    'index': block.index,
+                    'seconds': time.monotonic() - search_started,
+                    'nonce': block.proof
+                })
+            elif self.blockchain.get_tip()['hash'] != tip_hash:
+                self.restarts += 1
+            elif not self.__stopping.is_set():
+                self.__stopping.wait(self.retry_delay)
+
+    def get_status(self):
+        block_times = list(self.block_times)
+        running = self.running
+        return {
+            'running': running,
+            'started_at': self.started_at if running else None,
+            'blocks_mined': self.blocks_mined,
+            'restarts': self.restarts,
+            'current_nonce': self.blockchain.miner.current_nonce if running else None,
+            'hashrate': self.blockchain.miner.hashrate if running else 0.0,
+            'average_block_time': sum(entry['seconds'] for entry in block_times) / len(block_times)
+            if block_times else None,
+            'block_times': block_times
+        }
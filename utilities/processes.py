@@ -0,0 +1,19 @@
+"""Start method for worker processes spawned by a threaded node."""
+
+import multiprocessing as mp
+
+from configuration import Configuration
+
+
+class ProcessContext:
+    PRELOAD_MODULES = ['__main__', 'blockchain', 'wallet', 'utilities.miner']
+
+    @classmethod
+    def get(cls):
+        method = Configuration.PROCESS_START_METHOD
+        if method not in mp.get_all_start_methods():
+            method = 'spawn'
+        context = mp.get_context(method)
+        if method == 'forkserver':
+            context.set_forkserver_preload(cls.PRELOAD_MODULES)
+        return context
@@ -0,0 +1,66 @@
+"""Opt-in sampling profiler that aggregates thread stacks."""
+
+import sys
+import threading
+from collections import Counter
+
+
+class SamplingProfiler:
+    def __init__(self, interval, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self.__stacks = Counter()
+        self.__lock = threading.Lock()
+        self.__stopping = threading.Event()
+        self.__thread = None
+
+    @property
+    def running(self):
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return False
+        self.__stopping.clear()
+        self.__thread = threading.Thread(target=self.run, name='sampling-profiler', daemon=True)
+        self.__thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self.__stopping.set()
+        self.__thread.join()
+        self.__thread = None
+        return True
+
+    def run(self):
+        own_thread = threading.get_ident()
+        while not self.__stopping.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                self._collapse(thread_names.get(ident, str(ident)), frame)
+                for ident, frame in sys._current_frames().items() if ident != own_thread
+            ]
+            with self.__lock:
+                self.__stacks.update(stacks)
+                self.samples += 1
+
+    def _collapse(self, thread_name, frame):
+        functions = []
+        while frame is not None and len(functions) < self.max_depth:
+            code = frame.f_code
+            functions.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join([thread_name] + functions[::-1])
+
+    def reset(self):
+        with self.__lock:
+            self.__stacks.clear()
+            self.samples = 0
+
+    def collapsed(self, limit=None):
+        with self.__lock:
+            stacks = self.__stacks.most_common(limit)
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks)
@@ -0,0 +1,446 @@
+"""Append-only persistence for blockchain data."""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+
+from configuration import Configuration
+
+
+class ChainStorage:
+    SEGMENT_NAME = '{:08d}.log'
+    INDEX_NAME = 'index'
+    INDEX_MAGIC = b'BIDX'
+    INDEX_VERSION = 1
+    INDEX_HEADER = struct.Struct('<4sII')
+    INDEX_RECORD = struct.Struct('<QI')
+
+    def __init__(self, base_path, segment_size=None):
+        self.base_path = base_path
+        self.blocks_path = base_path + '.blocks'
+        self.mempool_path = base_path + '.mempool'
+        self.mempool_journal_path = base_path + '.mempool.log'
+        self.peers_path = base_path + '.peers'
+        self.ledger_path = base_path + '.ledger'
+        self.utxo_path = base_path + '.utxo'
+        self.addresses_path = base_path + '.addresses'
+        self.address_heads_path = base_path + '.addresses.heads'
+        self.segment_size = Configuration.STORAGE_SEGMENT_BLOCKS if segment_size is None else segment_size
+        self.height = 0
+        self.__index = None
+        self.__segment_files = {}
+        self.__segment_files_lock = threading.Lock()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.blocks_path, self.INDEX_NAME)
+
+    def open(self):
+        self.close()
+        self.migrate_legacy()
+        self.height = 0
+        if not os.path.isdir(self.blocks_path):
+            return
+        if not self._index_is_consistent():
+            print('Block index is missing or stale, rebuilding it!')
+            self.rebuild_index()
+        self._map_index()
+
+    def close(self):
+        if self.__index is not None:
+            self.__index.close()
+            self.__index = None
+        with self.__segment_files_lock:
+            for segment_file in self.__segment_files.values():
+                segment_file.close()
+            self.__segment_files = {}
+
+    def migrate_legacy(self):
+        if not os.path.isfile(self.base_path) or os.path.isdir(self.blocks_path):
+            return False
+        with open(self.base_path, mode='r') as datastore:
+            file_content = datastore.readlines()
+        raw_blockchain_data = json.loads(file_content[0][:-1]) if len(file_content) > 0 else []
+        raw_open_transactions_data = json.loads(file_content[1][:-1]) if len(file_content) > 1 else []
+        raw_peer_nodes = json.loads(file_content[2]) if len(file_content) > 2 else []
+        self.save_mempool(raw_open_transactions_data)
+        self.save_peers(raw_peer_nodes)
+        blocks_path = self.blocks_path
+        self.blocks_path = blocks_path + '.tmp'
+        shutil.rmtree(self.blocks_path, ignore_errors=True)
+        try:
+            self.height = 0
+            self.append_blocks(raw_blockchain_data)
+        finally:
+            self.close()
+            self.blocks_path = blocks_path
+        os.replace(blocks_path + '.tmp', blocks_path)
+        os.replace(self.base_path, self.base_path + '.legacy')
+        self._fsync_directory(os.path.dirname(self.base_path) or '.')
+        print('Blockchain data migrated to append-only storage!')
+        return True
+
+    def read_block(self, index):
+        if not 0 <= index < self.height:
+            raise IndexError('block index out of range')
+        offset, length = self._index_record(index)
+        segment = index // self.segment_size
+        with self.__segment_files_lock:
+            segment_file = self.__segment_files.get(segment)
+            if segment_file is None:
+                segment_file = open(self._segment_path(segment), mode='rb')
+                self.__segment_files[segment] = segment_file
+        return json.loads(os.pread(segment_file.fileno(), length, offset))
+
+    def append_blocks(self, blocks):
+        blocks = list(blocks)
+        os.makedirs(self.blocks_path, exist_ok=True)
+        if not os.path.exists(self.index_path):
+            self._write_index([])
+        while blocks:
+            segment, position = divmod(self.height, self.segment_size)
+            batch = blocks[:self.segment_size - position]
+            blocks = blocks[len(batch):]
+            segment_path = self._segment_path(segment)
+            is_new_segment = not os.path.exists(segment_path)
+            lines = [(json.dumps(block) + '\n').encode() for block in batch]
+            records = []
+            with open(segment_path, mode='ab') as datastore:
+                offset = datastore.tell()
+                for line in lines:
+                    records.append((offset, len(line)))
+                    offset += len(line)
+                datastore.write(b''.join(lines))
+                datastore.flush()
+                os.fsync(datastore.fileno())
+            if is_new_segment:
+                self._fsync_directory(self.blocks_path)
+            with open(self.index_path, mode='ab') as index_file:
+                index_file.write(b''.join(self.INDEX_RECORD.pack(*record) for record in records))
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            self.height += len(batch)
+        self._map_index()
+
+    def replace_blocks(self, start_index, blocks):
+        self.truncate(start_index)
+        self.append_blocks(blocks)
+
+    def truncate(self, height):
+        if height >= self.height:
+            return
+        last_segment, kept = divmod(height, self.segment_size)
+        cut_offset = self._index_record(height)[0]
+        with open(self.index_path, mode='r+b') as index_file:
+            index_file.truncate(self.INDEX_HEADER.size + height * self.INDEX_RECORD.size)
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        self.close()
+        for segment in self._segment_numbers():
+            if segment > last_segment or (segment == last_segment and kept == 0):
+                os.remove(self._segment_path(segment))
+        if kept:
+            with open(self._segment_path(last_segment), mode='r+b') as datastore:
+                datastore.truncate(cut_offset)
+                datastore.flush()
+                os.fsync(datastore.fileno())
+        self._fsync_directory(self.blocks_path)
+        self.height = height
+        self._map_index()
+
+    def rebuild_index(self):
+        records = []
+        segments = self._segment_numbers()
+        for segment in segments:
+            if segment != len(records) // self.segment_size or len(records) % self.segment_size:
+                print('Dropping block segments after a gap!')
+                self._remove_segments_from(segment)
+                break
+            segment_records, complete = self._scan_segment(segment)
+            records.extend(segment_records)
+            if not complete:
+                self._remove_segments_from(segment + 1)
+                break
+        self._write_index(records)
+        self.height = len(records)
+
+    def load_mempool(self):
+        mempool_data = self._read_json(self.mempool_path, [])
+        if isinstance(mempool_data, list):
+            return 0, mempool_data
+        return mempool_data['sequence'], mempool_data['transactions']
+
+    def save_mempool(self, transactions, sequence=0):
+        self._write_atomically(self.mempool_path, json.dumps({'sequence': sequence, 'transactions': transactions}))
+
+    def read_mempool_journal(self):
+        return self._read_log(self.mempool_journal_path, 'mempool journal')
+
+    def append_mempool_journal(self, records):
+        return self._append_log(self.mempool_journal_path, records)
+
+    def truncate_mempool_journal(self):
+        self._truncate_log(self.mempool_journal_path, 0)
+
+    def load_peers(self):
+        return self._read_json(self.peers_path, [])
+
+    def save_peers(self, peer_nodes):
+        self._write_atomically(self.peers_path, json.dumps(peer_nodes))
+
+    def load_ledger(self):
+        return self._read_json(self.ledger_path, None)
+
+    def save_ledger(self, ledger_data):
+        self._write_atomically(self.ledger_path, json.dumps(ledger_data))
+
+    def load_utxos(self):
+        return self._read_json(self.utxo_path, None)
+
+    def save_utxos(self, utxo_data):
+        self._write_atomically(self.utxo_path, json.dumps(utxo_data))
+
+    def find_address_log_record(self, predicate):
+        return self._find_log_record(self.addresses_path, 'address index', predicate)
+
+    def iter_address_log(self, offset=0):
+        return self._iter_log(self.addresses_path, offset)
+
+    def read_address_log_chain(self, offset, link):
+        return self._read_log_chain(self.addresses_path, offset, link)
+
+    def address_log_size(self):
+        try:
+            return os.path.getsize(self.addresses_path)
+        except OSError:
+            return 0
+
+    def append_address_log(self, lines):
+        return self._append_lines(self.addresses_path, lines)
+
+    def truncate_address_log(self, offset):
+        return self._truncate_log(self.addresses_path, offset)
+
+    def load_address_heads(self):
+        return self._read_json(self.address_heads_path, None)
+
+    def save_address_heads(self, heads_data):
+        self._write_atomically(self.address_heads_path, json.dumps(heads_data))
+
+    @classmethod
+    def _read_log(cls, path, name):
+        records = []
+        offset = 0
+        try:
+            with open(path, mode='rb') as datastore:
+                for line in datastore:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        records.append((offset, json.loads(line)))
+                    except ValueError:
+                        break
+                    offset += len(line)
+        except IOError:
+            return []
+        if offset != os.path.getsize(path):
+            print(f'Dropping incomplete {name} record!')
+            cls._truncate_log(path, offset)
+        return records
+
+    @classmethod
+    def _find_log_record(cls, path, name, predicate):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        if not size:
+            return None
+        found = None
+        with open(path, mode='rb') as datastore, mmap.mmap(datastore.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            complete = end = data.rfind(b'\n') + 1
+            while end > 0:
+                start = data.rfind(b'\n', 0, end - 1) + 1
+                try:
+                    record = json.loads(data[start:end])
+                except ValueError:
+                    break
+                if predicate(record):
+                    found = (start, end, record)
+                    break
+                end = start
+        if complete != size:
+            print(f'Dropping incomplete {name} record!')
+            cls._truncate_log(path, complete)
+        return found
+
+    @staticmethod
+    def _iter_log(path, offset):
+        try:
+            datastore = open(path, mode='rb')
+        except IOError:
+            return
+        with datastore:
+            datastore.seek(offset)
+            for line in datastore:
+                if not line.endswith(b'\n'):
+                    return
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    return
+                yield offset, offset + len(line), record
+                offset += len(line)
+
+    @staticmethod
+    def _read_log_chain(path, offset, link):
+        records = []
+        with open(path, mode='rb') as datastore:
+            while offset is not None:
+                datastore.seek(offset)
+                line = datastore.readline()
+                if not line.endswith(b'\n'):
+                    raise ValueError(f'log record at {offset} is incomplete')
+                record = json.loads(line)
+                records.append(record)
+                offset = record.get(link)
+        return records
+
+    @staticmethod
+    def encode_log_record(record):
+        return (json.dumps(record) + '\n').encode()
+
+    @classmethod
+    def _append_log(cls, path, records):
+        return cls._append_lines(path, [cls.encode_log_record(record) for record in records])
+
+    @staticmethod
+    def _append_lines(path, lines):
+        offsets = []
+        with open(path, mode='ab') as datastore:
+            offset = datastore.tell()
+            for line in lines:
+                offsets.append(offset)
+                offset += len(line)
+            datastore.write(b''.join(lines))
+            datastore.flush()
+            os.fsync(datastore.fileno())
+        return offsets
+
+    @staticmethod
+    def _truncate_log(path, offset):
+        if not os.path.exists(path) or os.path.getsize(path) <= offset:
+            return False
+        with open(path, mode='r+b') as datastore:
+            datastore.truncate(offset)
+            datastore.flush()
+            os.fsync(datastore.fileno())
+        return True
+
+    def _index_is_consistent(self):
+        try:
+            index_size = os.path.getsize(self.index_path)
+            with open(self.index_path, mode='rb') as index_file:
+                magic, version, segment_size = self.INDEX_HEADER.unpack(index_file.read(self.INDEX_HEADER.size))
+        except (IOError, struct.error):
+            return False
+        if magic != self.INDEX_MAGIC or version != self.INDEX_VERSION:
+            return False
+        records_size = index_size - self.INDEX_HEADER.size
+        if records_size % self.INDEX_RECORD.size:
+            return False
+        self.segment_size = segment_size
+        height = records_size // self.INDEX_RECORD.size
+        segment_count = -(-height // segment_size)
+        if self._segment_numbers() != list(range(segment_count)):
+            return False
+        if height == 0:
+            return True
+        with open(self.index_path, mode='rb') as index_file:
+            index_file.seek(self.INDEX_HEADER.size + (height - 1) * self.INDEX_RECORD.size)
+            offset, length = self.INDEX_RECORD.unpack(index_file.read(self.INDEX_RECORD.size))
+        return os.path.getsize(self._segment_path(segment_count - 1)) == offset + length
+
+    def _index_record(self, index):
+        return self.INDEX_RECORD.unpack_from(self.__index, self.INDEX_HEADER.size + index * self.INDEX_RECORD.size)
+
+    def _map_index(self):
+        if self.__index is not None:
+            self.__index.close()
+            self.__index = None
+        if not os.path.exists(self.index_path):
+            self.height = 0
+            return
+        with open(self.index_path, mode='rb') as index_file:
+            self.__index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.height = (len(self.__index) - self.INDEX_HEADER.size) // self.INDEX_RECORD.size
+
+    def _write_index(self, records):
+        header = self.INDEX_HEADER.pack(self.INDEX_MAGIC, self.INDEX_VERSION, self.segment_size)
+        content = header + b''.join(self.INDEX_RECORD.pack(*record) for record in records)
+        self._write_atomically(self.index_path, content, mode='wb')
+
+    def _scan_segment(self, segment):
+        segment_path = self._segment_path(segment)
+        records = []
+        offset = 0
+        with open(segment_path, mode='rb') as datastore:
+            for line in datastore:
+                if not line.endswith(b'\n') or len(records) == self.segment_size:
+                    break
+                try:
+                    json.loads(line)
+                except ValueError:
+                    break
+                records.append((offset, len(line)))
+                offset += len(line)
+        complete = offset == os.path.getsize(segment_path) and len(records) == self.segment_size
+        if offset != os.path.getsize(segment_path):
+            print('Dropping incomplete block record!')
+            with open(segment_path, mode='r+b') as datastore:
+                datastore.truncate(offset)
+                datastore.flush()
+                os.fsync(datastore.fileno())
+        return records, complete
+
+    def _remove_segments_from(self, first_segment):
+        for segment in self._segment_numbers():
+            if segment >= first_segment:
+                os.remove(self._segment_path(segment))
+
+    def _segment_path(self, segment):
+        return os.path.join(self.blocks_path, self.SEGMENT_NAME.format(segment))
+
+    def _segment_numbers(self):
+        if not os.path.isdir(self.blocks_path):
+            return []
+        return sorted(int(name[:-4]) for name in os.listdir(self.blocks_path) if name.endswith('.log'))
+
+    @staticmethod
+    def _read_json(path, default):
+        try:
+            with open(path, mode='r') as datastore:
+                return json.loads(datastore.read())
+        except (IOError, ValueError):
+            return default
+
+    @classmethod
+    def _write_atomically(cls, path, content, mode='w'):
+        temporary_path = path + '.tmp'
+        with open(temporary_path, mode=mode) as datastore:
+            datastore.write(content)
+            datastore.flush()
+            os.fsync(datastore.fileno())
+        os.replace(temporary_path, path)
+        cls._fsync_directory(os.path.dirname(path) or '.')
+
+    @staticmethod
+    def _fsync_directory(path):
+        directory = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
@@ -0,0 +1,112 @@
+"""Lazily decoded view of a chain kept in ChainStorage."""
+
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from block import Block
+from configuration import Configuration
+
+
+class StoredChain:
+    def __init__(self, storage, unsaved_blocks=None, cache_size=None):
+        self.storage = storage
+        self.saved_height = storage.height
+        self.unsaved_blocks = list(unsaved_blocks or [])
+        self.cache_size = Configuration.BLOCK_CACHE_SIZE if cache_size is None else cache_size
+        self.__cache = OrderedDict()
+        self.__cache_lock = threading.Lock()
+
+    def __len__(self):
+        return self.saved_height + len(self.unsaved_blocks)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[index] for index in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('block index out of range')
+        if key >= self.saved_height:
+            return self.unsaved_blocks[key - self.saved_height]
+        with self.__cache_lock:
+            block = self.__cache.get(key)
+            if block is not None:
+                self.__cache.move_to_end(key)
+                return block
+        block_data = self.storage.read_block(key)
+        block = Block.from_savable_version(block_data)
+        if 'hash' in block_data and block.hash != block_data['hash']:
+            raise ValueError(f'Stored block {key} does not match its hash!')
+        self._cache_block(key, block)
+        return block
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, block):
+        self.unsaved_blocks.append(block)
+
+    def replace_from(self, index, blocks):
+        if index < self.saved_height:
+            self.saved_height = index
+            self.unsaved_blocks = list(blocks)
+            with self.__cache_lock:
+                for cached_index in [cached_index for cached_index in self.__cache if cached_index >= index]:
+                    del self.__cache[cached_index]
+        else:
+            self.unsaved_blocks = self.unsaved_blocks[:index - self.saved_height] + list(blocks)
+
+    def flush(self):
+        self.storage.replace_blocks(
+            self.saved_height,
+            [dict(block.get_savable_version(), hash=block.hash) for block in self.unsaved_blocks]
+        )
+        for index, block in enumerate(self.unsaved_blocks, start=self.saved_height):
+            self._cache_block(index, block)
+        self.saved_height = self.storage.height
+        self.unsaved_blocks = []
+
+    def _cache_block(self, index, block):
+        with self.__cache_lock:
+            self.__cache[index] = block
+            while len(self.__cache) > self.cache_size:
+                self.__cache.popitem(last=False)
+
+
+class ChainView:
+    def __init__(self, chain, lock=None):
+        self.__chain = chain
+        self.__lock = lock
+
+    def __len__(self):
+        with self._reading():
+            return len(self.__chain)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            raise TypeError('ChainView does not support slicing, use range()')
+        with self._reading():
+            return self.__chain[index]
+
+    def __iter__(self):
+        return self.range()
+
+    @property
+    def tip(self):
+        with self._reading():
+            return self.__chain[-1]
+
+    def range(self, start=0, stop=None):
+        index = max(0, start)
+        while stop is None or index < stop:
+            with self._reading():
+                if index >= len(self.__chain):
+                    return
+                block = self.__chain[index]
+            yield block
+            index += 1
+
+    def _reading(self):
+        return self.__lock.reading() if self.__lock is not None else nullcontext()
@@ -0,0 +1,105 @@
+"""Unspent transaction outputs for the optional UTXO ledger mode."""
+
+from collections import deque
+
+from configuration import Configuration
+
+
+class UtxoSet:
+    def __init__(self, undo_depth=None):
+        self.undo_depth = Configuration.UTXO_UNDO_DEPTH if undo_depth is None else undo_depth
+        self.__outputs = {}
+        self.__by_address = {}
+        self.__undo = deque(maxlen=self.undo_depth)
+
+    def __len__(self):
+        return len(self.__outputs)
+
+    @classmethod
+    def from_savable_version(cls, utxo_data):
+        utxos = cls()
+        for outpoint, address, amount in utxo_data['outputs']:
+            utxos._add(outpoint, address, amount)
+        for block_hash, spent in utxo_data['undo']:
+            utxos.__undo.append((block_hash, [[tuple(output) for output in tx_spent] for tx_spent in spent]))
+        return utxos
+
+    def get_savable_version(self):
+        return {
+            'outputs': [[outpoint, address, amount] for outpoint, (address, amount) in self.__outputs.items()],
+            'undo': [[block_hash, spent] for block_hash, spent in self.__undo]
+        }
+
+    @staticmethod
+    def transaction_id(block, transaction):
+        if transaction.sender == Configuration.MINING_SENDER:
+            return block.hash
+        return transaction.digest
+
+    @staticmethod
+    def outpoint(transaction_id, index):
+        return f'{transaction_id}:{index}'
+
+    @staticmethod
+    def outputs(transaction, input_total=0):
+        outputs = [(transaction.recipient, transaction.amount)]
+        change = input_total - transaction.cost
+        if transaction.inputs and change > 0:
+            outputs.append((transaction.sender, change))
+        return outputs
+
+    def get(self, outpoint):
+        return self.__outputs.get(outpoint)
+
+    def get_unspent(self, address):
+        return [(outpoint, self.__outputs[outpoint][1]) for outpoint in self.__by_address.get(address, {})]
+
+    def get_balance(self, address):
+        return sum(amount for _, amount in self.get_unspent(address))
+
+    def rebuild(self, chain):
+        self.__outputs.clear()
+        self.__by_address.clear()
+        self.__undo.clear()
+        for block in chain:
+            self.apply_block(block)
+
+    def apply_block(self, block):
+        if any(not tx.inputs and tx.sender != Configuration.MINING_SENDER for tx in block.transactions):
+            raise ValueError(f'block {block.index} has transactions without inputs')
+        if any(outpoint not in self.__outputs for tx in block.transactions for outpoint in tx.inputs):
+            raise ValueError(f'block {block.index} spends unknown outputs')
+        spent = []
+        for transaction in block.transactions:
+            tx_spent = [(outpoint,) + self._remove(outpoint) for outpoint in transaction.inputs]
+            input_total = sum(amount for _, _, amount in tx_spent)
+            transaction_id = self.transaction_id(block, transaction)
+            for index, (address, amount) in enumerate(self.outputs(transaction, input_total)):
+                self._add(self.outpoint(transaction_id, index), address, amount)
+            spent.append(tx_spent)
+        self.__undo.append((block.hash, spent))
+
+    def revert_block(self, block):
+        if not self.__undo or self.__undo[-1][0] != block.hash:
+            raise LookupError(f'no undo data for block {block.index}')
+        _, spent = self.__undo.pop()
+        for transaction, tx_spent in zip(reversed(block.transactions), reversed(spent)):
+            transaction_id = self.transaction_id(block, transaction)
+            for index in range(2):
+                outpoint = self.outpoint(transaction_id, index)
+                if outpoint in self.__outputs:
+                    self._remove(outpoint)
+            for outpoint, address, amount in tx_spent:
+                self._add(outpoint, address, amount)
+
+    def _add(self, outpoint, address, amount):
+        self.__outputs[outpoint] = (address, amount)
+        self.__by_address.setdefault(address, {})[outpoint] = None
+
+    def _remove(self, outpoint):
+        address, amount = self.__outputs.pop(outpoint)
+        address_outputs = self.__by_address[address]
+        del address_outputs[outpoint]
+        if not address_outputs:
+            del self.__by_address[address]
+        return address, amount
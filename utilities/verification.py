@@ -1,34 +1,150 @@
 """Verification methods for blockchain elements."""
 
+import math
+
+from utilities.encoding import BinaryEncoding
 from utilities.hash_util import HashUtil
+from utilities.metrics import REGISTRY
+from configuration import Configuration
+from block import Block
 from wallet import Wallet
 
+_proof_checks = REGISTRY.counter('verification_block_proofs_total', 'Block proof checks.', ['result'])
+_proof_check_seconds = REGISTRY.histogram('verification_block_proof_seconds', 'Time spent checking a block proof.')
+
 
 class Verification:
     @staticmethod
-    def valid_proof(transactions, last_hash, proof):
-        guess = (str([tx.to_ordered_dict() for tx in transactions]) + str(last_hash) + str(proof)).encode()
+    def proof_target(difficulty=None):
+        return '0' * (Configuration.MINING_DIFFICULTY if difficulty is None else difficulty)
+
+    @staticmethod
+    def proof_prefix(transactions, last_hash, version=None):
+        version = Configuration.BLOCK_VERSION if version is None else version
+        if version == Block.LEGACY_VERSION:
+            return b'[' + b', '.join(tx.canonical_bytes for tx in transactions) + b']' + str(last_hash).encode()
+        return BinaryEncoding.pack_uint8(version) \
+            + BinaryEncoding.pack_text(last_hash) \
+            + BinaryEncoding.UINT32.pack(len(transactions)) \
+            + b''.join(tx.to_bytes() for tx in transactions)
+
+    @classmethod
+    def valid_proof(cls, transactions, last_hash, proof, difficulty=None, version=None):
+        guess = cls.proof_prefix(transactions, last_hash, version) + str(proof).encode()
         guess_hash = HashUtil.hash_string_256(guess)
-        return guess_hash.startswith('00')
+        return guess_hash.startswith(cls.proof_target(difficulty))
+
+    @classmethod
+    def block_proof_prefix(cls, block):
+        if block.has_merkle_header:
+            return block.header_prefix()
+        return cls.proof_prefix(block.transactions[:-1], block.previous_hash, block.version)
+
+    @classmethod
+    def valid_block_proof(cls, block):
+        with _proof_check_seconds.time():
+            if block.has_merkle_header:
+                is_valid = block.hash.startswith(cls.proof_target(block.difficulty))
+            else:
+                is_valid = cls.valid_proof(block.transactions[:-1], block.previous_hash, block.proof,
+                                           block.difficulty, block.version)
+        _proof_checks.inc(result='valid' if is_valid else 'invalid')
+        return is_valid
+
+    @staticmethod
+    def valid_reward(block):
+        if not block.transactions:
+            return False
+        reward = block.transactions[-1]
+        fees = [tx.fee for tx in block.transactions[:-1]]
+        if any(fee < 0 for fee in fees):
+            return False
+        return reward.sender == Configuration.MINING_SENDER and reward.fee == 0 \
+            and reward.amount <= Configuration.MINING_REWARD + sum(fees)
+
+    @staticmethod
+    def valid_version(block, previous_block):
+        return block.version in Configuration.SUPPORTED_BLOCK_VERSIONS and block.version >= previous_block.version
 
     @classmethod
     def verify_chain(cls, blockchain):
-        for index, block in enumerate(blockchain):
-            if index == 0:
-                continue
-            if block.previous_hash != HashUtil.hash_block(blockchain[index - 1]):
+        if len(blockchain) < 2:
+            return True
+        return cls.verify_blocks(blockchain[1:], blockchain[0])
+
+    @classmethod
+    def verify_blocks(cls, blocks, previous_block):
+        for block in blocks:
+            if block.index != previous_block.index + 1:
                 return False
-            if not cls.valid_proof(block.transactions[:-1], block.previous_hash, block.proof):
+            if block.previous_hash != HashUtil.hash_block(previous_block):
                 return False
-        return True
+            if block.difficulty != Configuration.MINING_DIFFICULTY or not cls.valid_version(block, previous_block):
+                return False
+            if not cls.valid_block_proof(block) or not cls.valid_reward(block):
+                return False
+            previous_block = block
+        signed_transactions = [tx for block in blocks for tx in block.transactions[:-1]]
+        return all(Wallet.verify_transactions(signed_transactions))
 
     @staticmethod
-    def verify_transaction(transaction, get_balance_callback, check_funds=True):
+    def valid_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+    @classmethod
+    def valid_amounts(cls, amount, fee):
+        return cls.valid_number(amount) and cls.valid_number(fee) and amount > 0 and fee >= 0
+
+    @classmethod
+    def valid_fields(cls, transaction):
+        return all(isinstance(field, str) for field in (transaction.sender, transaction.recipient,
+                                                        transaction.signature) + transaction.inputs) \
+            and cls.valid_amounts(transaction.amount, transaction.fee)
+
+    @classmethod
+    def verify_transaction(cls, transaction, get_balance_callback, check_funds=True):
         if check_funds:
             sender_balance = get_balance_callback(transaction.sender)
-            return sender_balance >= transaction.amount and Wallet.verify_transaction(transaction)
+            return cls.valid_amounts(transaction.amount, transaction.fee) and sender_balance >= transaction.cost \
+                and Wallet.verify_transaction(transaction)
         return Wallet.verify_transaction(transaction)
 
+    @classmethod
+    def verify_funds(cls, transactions, get_balance_callback):
+        balances = {}
+        results = []
+        for transaction in transactions:
+            if transaction.sender not in balances:
+                balances[transaction.sender] = get_balance_callback(transaction.sender)
+            is_funded = cls.valid_amounts(transaction.amount, transaction.fee) \
+                and balances[transaction.sender] >= transaction.cost
+            if is_funded:
+                balances[transaction.sender] -= transaction.cost
+            results.append(is_funded)
+        return results
+
+    @staticmethod
+    def valid_inputs(transaction, get_output):
+        if not transaction.inputs or len(set(transaction.inputs)) != len(transaction.inputs) \
+                or transaction.amount < 0 or transaction.fee < 0:
+            return False
+        input_total = 0
+        for outpoint in transaction.inputs:
+            output = get_output(outpoint)
+            if output is None or output[0] != transaction.sender:
+                return False
+            input_total += output[1]
+        return input_total >= transaction.cost
+
+    @classmethod
+    def verify_block_inputs(cls, block, get_output):
+        spent = set()
+        for transaction in block.transactions[:-1]:
+            if not cls.valid_inputs(transaction, get_output) or not spent.isdisjoint(transaction.inputs):
+                return False
+            spent.update(transaction.inputs)
+        return not block.transactions or not block.transactions[-1].inputs
+
     @classmethod
     def verify_transactions(cls, open_transactions, get_balance_callback):
-        return all([cls.verify_transaction(tx, get_balance_callback, check_funds=False) for tx in open_transactions])
+        return all(Wallet.verify_transactions(open_transactions))
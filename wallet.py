@@ -1,20 +1,119 @@
 import json
-from Crypto.PublicKey import RSA
-from Crypto.Signature import PKCS1_v1_5
+from concurrent.futures import ProcessPoolExecutor
+from Crypto.PublicKey import ECC, RSA
+from Crypto.Signature import PKCS1_v1_5, eddsa
 from Crypto.Hash import SHA256
 import Crypto.Random
 import binascii
 from configuration import Configuration
+from utilities.cache import LRUCache
+from utilities.metrics import REGISTRY
+from utilities.processes import ProcessContext
+
+_verification_pool = None
+_verifier_cache = LRUCache(Configuration.PUBLIC_KEY_CACHE_SIZE)
+_signature_cache = LRUCache(Configuration.SIGNATURE_CACHE_SIZE)
+_signature_checks = REGISTRY.counter('wallet_signature_checks_total', 'Transaction signature checks.', ['result'])
+_cache_lookups = REGISTRY.counter('wallet_cache_lookups_total', 'Wallet cache lookups.', ['cache', 'result'])
+REGISTRY.gauge('wallet_verifier_cache_entries', 'Public key verifiers held in the cache.',
+               function=lambda: len(_verifier_cache))
+REGISTRY.gauge('wallet_signature_cache_entries', 'Signature check results held in the cache.',
+               function=lambda: len(_signature_cache))
+_verification_seconds = REGISTRY.histogram(
+    'wallet_verify_transactions_seconds', 'Time spent verifying a batch of transaction signatures.'
+)
+
+
+def _ed25519_verifier(public_key):
+    verifier = eddsa.new(public_key, 'rfc8032')
+
+    def verify(message_hash, signature):
+        try:
+            verifier.verify(message_hash.digest(), signature)
+            return True
+        except ValueError:
+            return False
+    return verify
+
+
+def _new_verifier(sender):
+    key_data = binascii.unhexlify(sender)
+    if key_data.startswith(Wallet.ED25519_PUBLIC_KEY_PREFIX):
+        return _ed25519_verifier(ECC.import_key(key_data))
+    return PKCS1_v1_5.new(RSA.importKey(key_data)).verify
+
+
+def _new_signer(private_key):
+    key_data = binascii.unhexlify(private_key)
+    if key_data.startswith(Wallet.ED25519_PRIVATE_KEY_PREFIX):
+        signer = eddsa.new(ECC.import_key(key_data), 'rfc8032')
+        return lambda message_hash: signer.sign(message_hash.digest())
+    return PKCS1_v1_5.new(RSA.importKey(key_data)).sign
+
+
+def _get_verifier(sender):
+    verifier = _verifier_cache.get(sender)
+    if verifier is None:
+        _cache_lookups.inc(cache='verifiers', result='miss')
+        verifier = _new_verifier(sender)
+        _verifier_cache.put(sender, verifier)
+    else:
+        _cache_lookups.inc(cache='verifiers', result='hit')
+    return verifier
+
+
+def _signature_digest(sender, recipient, amount, signature, fee, inputs):
+    return SHA256.new(repr((sender, recipient, amount, signature, fee, inputs)).encode('utf8')).digest()
+
+
+def _signed_message(sender, recipient, amount, fee, inputs=()):
+    message = str(sender) + str(recipient) + str(amount)
+    if fee:
+        message += '|fee=' + str(fee)
+    if inputs:
+        message += '|inputs=' + ','.join(inputs)
+    return SHA256.new(message.encode('utf8'))
+
+
+def _verify_signature(sender, recipient, amount, signature, fee=0, inputs=()):
+    try:
+        verify = _get_verifier(sender)
+        hash_to_check = _signed_message(sender, recipient, amount, fee, inputs)
+        return verify(hash_to_check, binascii.unhexlify(signature))
+    except (ValueError, TypeError, IndexError):
+        return False
+
+
+def _verify_signatures(transaction_fields):
+    return [_verify_signature(*fields) for fields in transaction_fields]
+
+
+def _get_verification_pool():
+    global _verification_pool
+    if _verification_pool is None:
+        _verification_pool = ProcessPoolExecutor(max_workers=Configuration.VERIFICATION_WORKERS,
+                                                 mp_context=ProcessContext.get())
+    return _verification_pool
 
 
 class Wallet:
-    def __init__(self, network_id=None):
+    RSA_SCHEME = 'rsa'
+    ED25519_SCHEME = 'ed25519'
+    KEY_SCHEMES = (RSA_SCHEME, ED25519_SCHEME)
+    ED25519_PUBLIC_KEY_PREFIX = bytes.fromhex('302a300506032b6570032100')
+    ED25519_PRIVATE_KEY_PREFIX = bytes.fromhex('302e020100300506032b657004220420')
+
+    def __init__(self, network_id=None, scheme=None):
         self.private_key = None
         self.public_key = None
+        self.scheme = Configuration.KEY_SCHEME if scheme is None else scheme
         self.network_id = network_id if network_id is not None else ''
+        self.__signer = None
 
-    def create_keys(self):
-        private_key, public_key = self.generate_keys()
+    def create_keys(self, scheme=None):
+        if scheme is not None:
+            self.scheme = scheme
+        private_key, public_key = self.generate_keys(self.scheme)
         self.private_key = private_key
         self.public_key = public_key
 
@@ -25,6 +124,7 @@ class Wallet:
                 raw_wallet_data = json.loads(file_content[0])
                 self.private_key = raw_wallet_data['private_key']
                 self.public_key = raw_wallet_data['public_key']
+                self.scheme = raw_wallet_data.get('scheme', self.key_scheme(self.public_key))
             return True
         except (IOError, IndexError):
             print('Error while reading wallet data, assuming wallet not set!')
@@ -36,14 +136,27 @@ class Wallet:
             return
         try:
             with open(Configuration.WALLET_FILE + str(self.network_id), mode='w') as datastore:
-                datastore.write(json.dumps({'public_key': self.public_key, 'private_key': self.private_key}))
+                datastore.write(json.dumps({
+                    'public_key': self.public_key,
+                    'private_key': self.private_key,
+                    'scheme': self.scheme
+                }))
             return True
         except IOError:
             print('Error while saving wallet data!')
             return False
 
-    @staticmethod
-    def generate_keys():
+    @classmethod
+    def generate_keys(cls, scheme=None):
+        scheme = Configuration.KEY_SCHEME if scheme is None else scheme
+        if scheme == cls.ED25519_SCHEME:
+            private_key = ECC.generate(curve='Ed25519', randfunc=Crypto.Random.new().read)
+            return (
+                binascii.hexlify(private_key.export_key(format='DER')).decode('ascii'),
+                binascii.hexlify(private_key.public_key().export_key(format='DER')).decode('ascii')
+            )
+        if scheme != cls.RSA_SCHEME:
+            raise ValueError(f'unknown key scheme {scheme}')
         private_key = RSA.generate(1024, Crypto.Random.new().read)
         public_key = private_key.publickey()
         return (
@@ -51,17 +164,54 @@ class Wallet:
             binascii.hexlify(public_key.exportKey(format='DER')).decode('ascii')
         )
 
-    def sign_transaction(self, sender, recipient, amount):
-        signer = PKCS1_v1_5.new(RSA.importKey(binascii.unhexlify(self.private_key)))
-        hash_to_sign = SHA256.new((str(sender) + str(recipient) + str(amount)).encode('utf8'))
-        signature = signer.sign(hash_to_sign)
+    @classmethod
+    def key_scheme(cls, public_key):
+        if binascii.unhexlify(public_key).startswith(cls.ED25519_PUBLIC_KEY_PREFIX):
+            return cls.ED25519_SCHEME
+        return cls.RSA_SCHEME
+
+    def sign_transaction(self, sender, recipient, amount, fee=0, inputs=()):
+        signer = self.__signer
+        if signer is None or signer[0] != self.private_key:
+            signer = (self.private_key, _new_signer(self.private_key))
+            self.__signer = signer
+        hash_to_sign = _signed_message(sender, recipient, amount, fee, tuple(inputs))
+        signature = signer[1](hash_to_sign)
         return binascii.hexlify(signature).decode('ascii')
 
     @staticmethod
     def verify_transaction(transaction):
-        public_key = RSA.importKey(binascii.unhexlify(transaction.sender))
-        verifier = PKCS1_v1_5.new(public_key)
-        hash_to_check = \
-            SHA256.new((str(transaction.sender) + str(transaction.recipient) + str(transaction.amount)).encode('utf8'))
-        return verifier.verify(hash_to_check, binascii.unhexlify(transaction.signature))
+        return Wallet.verify_transactions([transaction])[0]
 
+    @staticmethod
+    def verify_transactions(transactions):
+        with _verification_seconds.time():
+            return Wallet._verify_transactions(transactions)
+
+    @staticmethod
+    def _verify_transactions(transactions):
+        transaction_fields = [
+            (tx.sender, tx.recipient, tx.amount, tx.signature, tx.fee, tx.inputs) for tx in transactions
+        ]
+        digests = [_signature_digest(*fields) for fields in transaction_fields]
+        results = [_signature_cache.get(digest) for digest in digests]
+        missing = [position for position, result in enumerate(results) if result is None]
+        missing_fields = [transaction_fields[position] for position in missing]
+        _cache_lookups.inc(len(results) - len(missing), cache='signatures', result='hit')
+        _cache_lookups.inc(len(missing), cache='signatures', result='miss')
+        workers = Configuration.VERIFICATION_WORKERS
+        if workers <= 1 or len(missing_fields) < Configuration.PARALLEL_VERIFICATION_THRESHOLD:
+            missing_results = _verify_signatures(missing_fields)
+        else:
+            chunk_size = -(-len(missing_fields) // (workers * 4))
+            chunks = [missing_fields[start:start + chunk_size] for start in range(0, len(missing_fields), chunk_size)]
+            missing_results = []
+            for chunk_results in _get_verification_pool().map(_verify_signatures, chunks):
+                missing_results.extend(chunk_results)
+        for position, result in zip(missing, missing_results):
+            results[position] = result
+            _signature_cache.put(digests[position], result)
+        _signature_checks.inc(len(results) - len(missing), result='cached')
+        _signature_checks.inc(sum(1 for result in missing_results if result), result='valid')
+        _signature_checks.inc(sum(1 for result in missing_results if not result), result='invalid')
+        return results